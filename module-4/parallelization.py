@@ -14,6 +14,17 @@ from langchain_openai import ChatOpenAI
 from langchain_community.tools import TavilySearchResults
 from langchain_community.document_loaders import WikipediaLoader
 
+import sys
+sys.path.append(str(Path(__file__).parent / "studio"))
+from mock_search import search_backends
+from wiki_snapshot import wikipedia_backend
+
+# Serve Wikipedia from a local snapshot instead of the API when WIKIPEDIA_SNAPSHOT is set
+WikipediaLoader = wikipedia_backend(WikipediaLoader)
+
+# Serve both searches from the local mock service when MOCK_SEARCH is set (see studio/mock_search.py)
+TavilySearchResults, WikipediaLoader = search_backends(TavilySearchResults, WikipediaLoader)
+
 class State(TypedDict):
     # This operator appends. If two parallel nodes update the same key, we get an error.
     state: Annotated[list, operator.add]
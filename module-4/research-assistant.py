@@ -19,6 +19,17 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.constants import Send
 from langgraph.pregel import RetryPolicy
 
+import sys
+sys.path.append(str(Path(__file__).parent / "studio"))
+from mock_search import search_backends
+from wiki_snapshot import wikipedia_backend
+
+# Serve Wikipedia from a local snapshot instead of the API when WIKIPEDIA_SNAPSHOT is set
+WikipediaLoader = wikipedia_backend(WikipediaLoader)
+
+# Serve both searches from the local mock service when MOCK_SEARCH is set (see studio/mock_search.py)
+TavilySearchResults, WikipediaLoader = search_backends(TavilySearchResults, WikipediaLoader)
+
 llm = ChatOpenAI(model="gpt-4o", temperature=0)
 
 # Create Analysts and review them with human-in-the-loop feedback
@@ -0,0 +1,132 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+
+from wrapped_models import through
+
+# Micro-batched model calls. With many analysts, the nodes of concurrent interview
+# branches call the model at nearly the same moment. The dispatcher collects the
+# requests arriving within a short window and sends each group of compatible requests
+# (same model, tools and stop words) through the model's batch() interface, with at most
+# max_concurrency requests of a batch in flight and at most max_batches batches at once.
+# Each waiting node gets its own result back, callbacks (budget, profiler) still see
+# every call on the node's side.
+#
+#   RESEARCH_LLM_BATCH_WINDOW=0.02        seconds to collect a batch, 0 disables batching
+#   RESEARCH_LLM_BATCH_SIZE=32            requests per batch at most
+#   RESEARCH_LLM_BATCH_CONCURRENCY=8      requests of one batch in flight at once
+#
+# A model with a real batch endpoint only has to implement batch() for all of them to
+# go out as one request.
+
+class MicroBatcher:
+    """ Collects concurrent chat requests into batches """
+
+    def __init__(self, window: float = 0.0, max_batch: int = 32, max_concurrency: int = 8, max_batches: int = 4):
+        self.window = window
+        self.max_batch = max_batch
+        self.max_concurrency = max_concurrency
+        self._requests = queue.Queue()
+        self._senders = ThreadPoolExecutor(max_workers=max_batches, thread_name_prefix="llm-batch")
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    @classmethod
+    def from_env(cls) -> "MicroBatcher":
+        return cls(window=float(os.environ.get("RESEARCH_LLM_BATCH_WINDOW", 0)),
+                   max_batch=int(os.environ.get("RESEARCH_LLM_BATCH_SIZE", 32)),
+                   max_concurrency=int(os.environ.get("RESEARCH_LLM_BATCH_CONCURRENCY", 8)))
+
+    def chat_model(self, model: BaseChatModel) -> BaseChatModel:
+        """ The model itself when batching is off, otherwise a wrapper that batches its calls """
+        if self.window <= 0:
+            return model
+        return BatchingChatModel(model=model, batcher=self)
+
+    def submit(self, model: BaseChatModel, messages: list, stop: Optional[list], kwargs: dict) -> Future:
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="llm-batcher", daemon=True)
+                self._thread.start()
+        self._requests.put((model, messages, stop, kwargs, future))
+        return future
+
+    def _dispatch(self):
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            # Only requests with the same model and parameters can share a batch() call
+            groups = {}
+            for request in batch:
+                model, _, stop, kwargs, _ = request
+                key = (id(model), json.dumps([stop, kwargs], sort_keys=True, default=str))
+                groups.setdefault(key, []).append(request)
+            for group in groups.values():
+                self._senders.submit(self._send, group)
+
+    def _send(self, group: list):
+        model, _, stop, kwargs, _ = group[0]
+        with self._lock:
+            self.batches += 1
+            self.requests += len(group)
+        try:
+            outputs = model.batch([messages for _, messages, _, _, _ in group],
+                                  config={"max_concurrency": self.max_concurrency},
+                                  return_exceptions=True, stop=stop, **kwargs)
+        except Exception as error:
+            outputs = [error] * len(group)
+        for (_, _, _, _, future), output in zip(group, outputs):
+            if isinstance(output, Exception):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "batches": self.batches,
+                    "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0}
+
+class BatchingChatModel(BaseChatModel):
+    """ Chat model whose calls go through a MicroBatcher to the wrapped model """
+
+    model: BaseChatModel
+    batcher: MicroBatcher
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "batching"
+
+    def bind_tools(self, tools, **kwargs):
+        # The wrapped model formats the tools, so batched requests are unchanged
+        return through(self.model.bind_tools(tools, **kwargs), self.model, self)
+
+    def with_structured_output(self, schema, **kwargs):
+        # The wrapped model picks the method, tool_choice and parser, only its calls are batched
+        return through(self.model.with_structured_output(schema, **kwargs), self.model, self)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        kwargs.pop("ls_structured_output_format", None)
+        message: AIMessage = self.batcher.submit(self.model, messages, stop, kwargs).result()
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,70 @@
+"""Compare research runs with and without micro-batched model calls."""
+import argparse
+import os
+import threading
+import time
+
+# Runs the research graph offline with a fake model that pays a fixed overhead per
+# upstream request, serves a limited number of requests at once (like a rate limited
+# provider) and has a batch endpoint (one overhead per batch, like a provider batch
+# API), with batching off and on. Reports wall time, upstream requests and the mean
+# batch size.
+#
+#   python bench_batching.py --analysts 8 --overhead 0.05 --upstream-limit 4 --window 0.02
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysts", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--overhead", type=float, default=0.05, help="Seconds per upstream request")
+    parser.add_argument("--upstream-limit", type=int, default=4, help="Upstream requests served at once")
+    parser.add_argument("--window", type=float, default=0.02, help="Batching window in seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from langgraph.checkpoint.memory import MemorySaver
+    import research_assistant
+    from batching import MicroBatcher
+    from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+
+    class BatchEndpointModel(FakeChatModel):
+        """ Every upstream request pays the overhead once, a batch() is a single request """
+        upstream: int = 0
+
+        def request(self):
+            with upstream:
+                self.upstream += 1
+                time.sleep(args.overhead)
+
+        def invoke(self, *args, **kwargs):
+            self.request()
+            return super().invoke(*args, **kwargs)
+
+        def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+            self.request()
+            return [super(BatchEndpointModel, self).invoke(messages, **kwargs) for messages in inputs]
+
+    upstream = threading.Semaphore(args.upstream_limit)
+    research_assistant.TavilySearchResults = FakeTavilySearch
+    research_assistant.WikipediaLoader = FakeWikipediaLoader
+
+    for window in (0.0, args.window):
+        model = BatchEndpointModel(array_length=args.analysts)
+        batcher = MicroBatcher(window=window, max_concurrency=args.concurrency)
+        research_assistant.llm = batcher.chat_model(model)
+
+        graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+        # Enough graph workers for every interview branch to be in flight at once
+        config = {"configurable": {"thread_id": str(window)}, "max_concurrency": 4 * args.analysts}
+        start = time.perf_counter()
+        graph.invoke({"topic": "Micro-batching", "max_analysts": args.analysts, "max_num_turns": args.turns}, config)
+        graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+        result = graph.invoke(None, config)
+        elapsed = time.perf_counter() - start
+        assert len(result["sections"]) == args.analysts
+        label = f"window {window * 1000:.0f}ms" if window else "no batching"
+        print(f"{label:>14}: {elapsed:.2f}s, {model.upstream} upstream requests, batcher {batcher.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure MemorySaver checkpoint size of a research_assistant run."""
+import argparse
+import os
+import tempfile
+
+# Runs the research graph offline (fake model and searches) under a MemorySaver and
+# reports how many bytes the checkpointer holds, with documents stored in the blob
+# store (references in state) versus inline in state.
+#
+#   python bench_checkpoints.py --analysts 5 --turns 3
+
+def checkpoint_bytes(saver) -> int:
+    """ Serialized bytes held by a MemorySaver (checkpoints, channel blobs and pending writes) """
+    def size(value) -> int:
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if isinstance(value, dict):
+            return sum(size(v) for v in value.values())
+        if isinstance(value, (tuple, list)):
+            return sum(size(v) for v in value)
+        return 0
+    return size(dict(saver.storage)) + size(dict(saver.writes)) + size(dict(saver.blobs))
+
+def run(research_assistant, analysts: int, turns: int) -> tuple[int, int]:
+    from langgraph.checkpoint.memory import MemorySaver
+
+    saver = MemorySaver()
+    graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=saver)
+    config = {"configurable": {"thread_id": "bench"}}
+    graph.invoke({"topic": "Checkpoint size", "max_analysts": analysts, "max_num_turns": turns}, config)
+    graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+    graph.invoke(None, config)
+    checkpoints = sum(1 for _ in saver.list(None))
+    return checkpoint_bytes(saver), checkpoints
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysts", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    import research_assistant
+    from blobstore import BlobStore
+    from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+
+    research_assistant.llm = FakeChatModel(array_length=args.analysts)
+    research_assistant.TavilySearchResults = FakeTavilySearch
+    research_assistant.WikipediaLoader = FakeWikipediaLoader
+
+    results = {}
+    # Without a directory the store keeps documents inline in state
+    for name, store in (("inline", BlobStore()), ("blob store", BlobStore(tempfile.mkdtemp()))):
+        research_assistant.blobs = store
+        total, checkpoints = run(research_assistant, args.analysts, args.turns)
+        results[name] = total
+        extra = f" + {store.nbytes():,} bytes in {len(store)} blobs" if len(store) else ""
+        print(f"{name:>10}: {total:,} checkpoint bytes over {checkpoints} checkpoints{extra}")
+
+    saved = 1 - results["blob store"] / results["inline"]
+    print(f"{args.analysts} analysts, {args.turns} turns: checkpoints are {saved:.0%} smaller with the blob store")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Compare interview prompt sizes with and without rolling context compression."""
+import argparse
+import os
+
+# Runs the research graph offline (fake model and searches) with long interviews, once
+# with every turn in full and once with context_compression, and reports the input
+# tokens of the interview nodes from the profiler (see instrumentation.py), including
+# the digest calls, and checks that save_interview still has the full transcript.
+#
+#   python bench_compression.py --analysts 3 --turns 6 --keep 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysts", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--keep", type=int, default=1, help="context_compression: turns kept in full")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from langgraph.checkpoint.memory import MemorySaver
+    import research_assistant
+    from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+    from instrumentation import GraphProfiler
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class Transcripts(BaseCallbackHandler):
+        """ Collects the interview transcripts written by save_interview """
+        def __init__(self):
+            self.runs, self.interviews = set(), []
+        def on_chain_start(self, serialized, inputs, *, run_id, tags=None, metadata=None, **kwargs):
+            # The node run itself is tagged with its superstep, the runs inside it are not
+            is_node = any(tag.startswith("graph:step:") for tag in tags or [])
+            if is_node and (metadata or {}).get("langgraph_node") == "save_interview":
+                self.runs.add(run_id)
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            if run_id in self.runs and isinstance(outputs, dict) and "interview" in outputs:
+                self.interviews.append(outputs["interview"])
+
+    research_assistant.llm = FakeChatModel(array_length=args.analysts, reply_chars=600)
+    research_assistant.TavilySearchResults = FakeTavilySearch
+    research_assistant.WikipediaLoader = FakeWikipediaLoader
+
+    totals = {}
+    for label, keep in (("full context", 0), (f"compression (keep {args.keep})", args.keep)):
+        graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+        profiler, transcripts = GraphProfiler(), Transcripts()
+        config = {"configurable": {"thread_id": label, "context_compression": keep},
+                  "callbacks": [profiler, transcripts]}
+        graph.invoke({"topic": "Context compression", "max_analysts": args.analysts, "max_num_turns": args.turns}, config)
+        graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+        graph.invoke(None, config)
+
+        # Full transcripts: the opening, then a question and an answer per turn
+        messages = {interview.count("\nAI: ") + 1 for interview in transcripts.interviews}
+        assert len(transcripts.interviews) == args.analysts and messages == {1 + 2 * args.turns}, messages
+        nodes = profiler.summary()["interview_nodes"]
+        totals[label] = sum(stats["input_tokens"] for stats in nodes.values())
+        per_node = ", ".join(f"{node} {stats['input_tokens']:,}" for node, stats in sorted(nodes.items()) if stats["input_tokens"])
+        print(f"{label:>20}: {totals[label]:,} input tokens in interviews ({per_node})")
+
+    full, compressed = totals.values()
+    print(f"{args.analysts} analysts, {args.turns} turns: compression uses {compressed / full:.0%} of the input tokens")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Latency distribution of the parallelization graph, waiting for both searches or a deadline."""
+import argparse
+import os
+import random
+import statistics
+import time
+
+# Runs the parallelization graph offline (fake model and searches) on many questions.
+# Every search sleeps for a latency drawn from a lognormal distribution around its
+# provider's median, and with --spike-rate the response takes --spike seconds instead
+# (a slow provider's tail). Each mode is run on the same latency draws:
+#   wait all     generate_answer waits for the slowest branch
+#   deadline     a branch gives up after retrieval_deadline, generate_answer goes ahead
+#   wait late    the same deadline, and collect_stragglers waits up to --spike seconds
+#                for the stragglers (straggler_timeout) once the answer is out
+# and the table reports percentiles of the time to the answer, the 90th percentile of
+# the whole invoke, the answers that had both contexts, the stragglers and how many of
+# them collect_stragglers recorded a result for after the answer.
+#
+#   python bench_fanin.py --questions 100 --deadline 0.15 --spike-rate 0.1
+
+def percentile(values: list, q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+def time_to_answer(graph, inputs: dict, config: dict) -> tuple[float, float, dict]:
+    """ Seconds until generate_answer finished and until the run did, and the final state of the run """
+    start, answered = time.perf_counter(), None
+    for mode, chunk in graph.stream(inputs, config, stream_mode=["updates", "values"]):
+        if mode == "updates" and "generate_answer" in chunk:
+            answered = time.perf_counter() - start
+        elif mode == "values":
+            result = chunk
+    return answered, time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--web", type=float, default=0.05, help="Median web search seconds")
+    parser.add_argument("--wikipedia", type=float, default=0.08, help="Median Wikipedia seconds")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Lognormal spread of the latencies")
+    parser.add_argument("--spike-rate", type=float, default=0.1, help="Share of Wikipedia calls that hit the tail")
+    parser.add_argument("--spike", type=float, default=1.0, help="Seconds of a tail call")
+    parser.add_argument("--deadline", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    import parallelization
+    from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+
+    # One latency per question and provider, so both modes see the same slow calls
+    rng = random.Random(args.seed)
+    latencies = {}
+    for i in range(args.questions):
+        question = f"Question {i}?"
+        latencies["web", question] = rng.lognormvariate(0, args.sigma) * args.web
+        spike = rng.random() < args.spike_rate
+        latencies["wikipedia", question] = args.spike if spike else rng.lognormvariate(0, args.sigma) * args.wikipedia
+
+    class SlowTavilySearch(FakeTavilySearch):
+        def invoke(self, query: str) -> list[dict]:
+            time.sleep(latencies["web", query])
+            return super().invoke(query)
+
+    class SlowWikipediaLoader(FakeWikipediaLoader):
+        def load(self):
+            time.sleep(latencies["wikipedia", self.query])
+            return super().load()
+
+    parallelization.llm = FakeChatModel(reply_chars=200)
+    parallelization.TavilySearchResults = SlowTavilySearch
+    parallelization.WikipediaLoader = SlowWikipediaLoader
+
+    print(f"{args.questions} questions, web median {args.web}s, wikipedia median {args.wikipedia}s, "
+          f"{args.spike_rate:.0%} of wikipedia calls take {args.spike}s")
+    print(f"{'mode':>16} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7} {'invoke p90':>11} {'full context':>13} "
+          f"{'stragglers':>11} {'recorded':>9}")
+    modes = (("wait all", 0, 0), (f"deadline {args.deadline}s", args.deadline, 0),
+             ("wait late", args.deadline, args.spike))
+    for label, deadline, straggler_timeout in modes:
+        config = {"configurable": {"retrieval_deadline": deadline, "straggler_timeout": straggler_timeout}}
+        answers, invokes, full, stragglers, recorded = [], [], 0, 0, 0
+        for i in range(args.questions):
+            seconds, total, result = time_to_answer(parallelization.graph, {"question": f"Question {i}?"}, config)
+            answers.append(seconds)
+            invokes.append(total)
+            full += len(result["context"]) == 2
+            stragglers += len(result.get("stragglers", []))
+            recorded += sum(late["context"] is not None for late in result.get("late_context", []))
+        assert deadline or full == args.questions
+        print(f"{label:>16} {percentile(answers, 50):>6.3f}s {percentile(answers, 90):>6.3f}s "
+              f"{percentile(answers, 99):>6.3f}s {max(answers):>6.3f}s {percentile(invokes, 90):>10.3f}s "
+              f"{full / args.questions:>13.0%} "
+              f"{stragglers:>11} {recorded:>9}")
+
+if __name__ == "__main__":
+    main()
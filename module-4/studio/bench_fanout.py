@@ -0,0 +1,169 @@
+"""Benchmark Send fan-out width: dispatch latency, reducer cost, memory and checkpoint size."""
+import argparse
+import operator
+import os
+import time
+import tracemalloc
+from typing import Annotated
+
+from typing_extensions import TypedDict
+
+# The map-reduce shape of map_reduce.py (continue_to_jokes) and research_assistant.py
+# (initiate_all_interviews): one node produces N items, one Send per item, the branches
+# append to a list with the operator.add reducer, and one node reads the whole list.
+# The branch work is a fake (a plain function, or FakeChatModel with --fake-model) so
+# the numbers are LangGraph's own cost at each width.
+#
+# Two dispatch modes are compared:
+#   flat     all N Sends in one superstep, like the graphs do today
+#   chunked  at most --chunk Sends per superstep, a next_chunk node sends the next ones
+#
+# For every width and mode, three runs: without a checkpointer (wall time, time from
+# the dispatching edge to the first and the last branch start, reducer calls and time),
+# with a MemorySaver (wall time, checkpoint bytes) and with a MemorySaver under
+# tracemalloc (peak memory).
+#
+#   python bench_fanout.py --widths 10,100,1000 --chunk 100
+#   python bench_fanout.py --widths 10000 --chunk 500 --modes chunked
+
+class Timings:
+    """ Dispatch and reducer timings of one run """
+
+    def __init__(self):
+        self.dispatched = None
+        self.branch_starts = []
+        self.reducer_calls = 0
+        self.reducer_seconds = 0.0
+
+    def add(self, left: list, right: list) -> list:
+        start = time.perf_counter()
+        result = operator.add(left, right)
+        self.reducer_seconds += time.perf_counter() - start
+        self.reducer_calls += 1
+        return result
+
+timings = Timings()
+
+def timed_add(left: list, right: list) -> list:
+    return timings.add(left, right)
+
+class OverallState(TypedDict):
+    width: int
+    subjects: list
+    dispatched: int
+    jokes: Annotated[list, timed_add]
+    best: str
+
+def build(mode: str, chunk: int, joke):
+    from langgraph.constants import Send
+    from langgraph.graph import END, START, StateGraph
+
+    def generate_topics(state: OverallState):
+        return {"subjects": [f"subject {i}" for i in range(state["width"])], "dispatched": 0}
+
+    def generate_joke(state: dict):
+        timings.branch_starts.append(time.perf_counter())
+        return {"jokes": [joke(state["subject"])]}
+
+    def best_joke(state: OverallState):
+        return {"best": max(state["jokes"], key=len)}
+
+    def send(subjects: list) -> list:
+        if timings.dispatched is None:
+            timings.dispatched = time.perf_counter()
+        return [Send("generate_joke", {"subject": subject}) for subject in subjects]
+
+    builder = StateGraph(OverallState)
+    builder.add_node("generate_topics", generate_topics)
+    builder.add_node("generate_joke", generate_joke)
+    builder.add_node("best_joke", best_joke)
+    builder.add_edge(START, "generate_topics")
+    builder.add_edge("best_joke", END)
+
+    if mode == "flat":
+        builder.add_conditional_edges("generate_topics", lambda state: send(state["subjects"]), ["generate_joke"])
+        builder.add_edge("generate_joke", "best_joke")
+        return builder
+
+    def next_chunk(state: OverallState):
+        return {"dispatched": state["dispatched"] + chunk}
+
+    def continue_chunk(state: OverallState):
+        start = state["dispatched"]
+        if start >= len(state["subjects"]):
+            return "best_joke"
+        return send(state["subjects"][start:start + chunk])
+
+    builder.add_node("next_chunk", next_chunk)
+    builder.add_conditional_edges("generate_topics", continue_chunk, ["generate_joke", "best_joke"])
+    builder.add_edge("generate_joke", "next_chunk")
+    builder.add_conditional_edges("next_chunk", continue_chunk, ["generate_joke", "best_joke"])
+    return builder
+
+def run(builder, width: int, checkpointer=None) -> tuple[float, dict]:
+    global timings
+    timings = Timings()
+    graph = builder.compile(checkpointer=checkpointer)
+    config = {"configurable": {"thread_id": "bench"}, "recursion_limit": 2 * width + 10}
+    start = time.perf_counter()
+    result = graph.invoke({"width": width}, config)
+    elapsed = time.perf_counter() - start
+    assert len(result["jokes"]) == width
+    return elapsed, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--widths", default="10,100,1000")
+    parser.add_argument("--modes", default="flat,chunked")
+    parser.add_argument("--chunk", type=int, default=100, help="Sends per superstep in chunked mode")
+    parser.add_argument("--fake-model", action="store_true", help="Generate jokes with FakeChatModel structured output")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from langgraph.checkpoint.memory import MemorySaver
+    from bench_checkpoints import checkpoint_bytes
+
+    if args.fake_model:
+        from pydantic import BaseModel
+        from fakes import FakeChatModel
+
+        class Joke(BaseModel):
+            joke: str
+
+        structured = FakeChatModel().with_structured_output(Joke)
+
+        def joke(subject: str) -> str:
+            return structured.invoke(f"Generate a joke about {subject}").joke
+    else:
+        def joke(subject: str) -> str:
+            return f"A joke about {subject}"
+
+    print(f"{'width':>6} {'mode':>8} {'wall':>8} {'first':>8} {'last':>8} {'reducer':>16} "
+          f"{'ckpt wall':>9} {'ckpt bytes':>12} {'ckpts':>6} {'peak mem':>10}")
+    for width in [int(w) for w in args.widths.split(",")]:
+        for mode in args.modes.split(","):
+            builder = build(mode, args.chunk, joke)
+
+            wall, _ = run(builder, width)
+            first = min(timings.branch_starts) - timings.dispatched
+            last = max(timings.branch_starts) - timings.dispatched
+            reducer = f"{timings.reducer_calls}x {timings.reducer_seconds * 1000:.1f}ms"
+
+            saver = MemorySaver()
+            checkpointed, _ = run(builder, width, saver)
+            size = checkpoint_bytes(saver)
+            checkpoints = sum(1 for _ in saver.list(None))
+
+            peak = "-"
+            if not args.no_memory:
+                tracemalloc.start()
+                run(builder, width, MemorySaver())
+                peak = f"{tracemalloc.get_traced_memory()[1] / 2 ** 20:.1f}MB"
+                tracemalloc.stop()
+
+            print(f"{width:>6} {mode:>8} {wall:>7.3f}s {first * 1000:>6.1f}ms {last * 1000:>6.1f}ms {reducer:>16} "
+                  f"{checkpointed:>8.3f}s {size:>12,} {checkpoints:>6} {peak:>10}")
+
+if __name__ == "__main__":
+    main()
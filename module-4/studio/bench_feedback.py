@@ -0,0 +1,64 @@
+"""Compare revising one analyst of a finished research run against regenerating all of them."""
+import argparse
+import os
+
+# Runs the research graph offline (fake model and searches) to the final report, then
+# sends feedback about a single analyst, once targeted (analyst_feedback) and once as
+# general feedback (human_analyst_feedback), and counts the model calls each takes to
+# produce the next report.
+#
+#   python bench_feedback.py --analysts 5 --turns 3
+
+def approve(graph, config: dict) -> dict:
+    graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+    return graph.invoke(None, config)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysts", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from langgraph.checkpoint.memory import MemorySaver
+    import research_assistant
+    from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+
+    llm = FakeChatModel(array_length=args.analysts)
+    research_assistant.llm = llm
+    research_assistant.TavilySearchResults = FakeTavilySearch
+    research_assistant.WikipediaLoader = FakeWikipediaLoader
+
+    def count() -> int:
+        return next(llm.calls)
+
+    rows = {}
+    for mode in ("targeted", "general"):
+        graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+        config = {"configurable": {"thread_id": mode}}
+        graph.invoke({"topic": "Revising analysts", "max_analysts": args.analysts, "max_num_turns": args.turns}, config)
+        first = approve(graph, config)
+        analysts = first["analysts"]
+
+        target = analysts[-1].name
+        if mode == "targeted":
+            feedback = {"analyst_feedback": {target: "Focus on deployment costs instead."}}
+        else:
+            feedback = {"human_analyst_feedback": f"Replace {target} with an analyst focused on deployment costs."}
+        graph.update_state(config, feedback, as_node="human_feedback")
+        start = count()
+        graph.invoke(None, config)
+        second = approve(graph, config)
+        rows[mode] = count() - start - 1
+
+        kept = sum(a.key == b.key for a, b in zip(analysts, second["analysts"]))
+        # Only the current analysts' interviews and sections are left
+        assert set(second["interviews"]) == {analyst.key for analyst in second["analysts"]}
+        assert sorted(second["sections"]) == sorted(s for sections in second["interviews"].values() for s in sections)
+        print(f"{mode:>9}: {rows[mode]} model calls for the next report, {kept}/{len(analysts)} analysts kept")
+
+    print(f"{args.analysts} analysts, {args.turns} turns: targeted feedback takes "
+          f"{rows['targeted'] / rows['general']:.0%} of the model calls of general feedback")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare the dict-based failure analysis of sub_graphs.py with columnar LogBatch arrays."""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+# Builds --logs synthetic logs (about a third graded, spread over a few graders) and
+# times the work of the failure analysis on them both ways:
+#   dicts     "grade" in log filter, processed_logs updates from lists of IDs, per grader stats in a loop
+#   columnar  LogBatch.failures(), processed_logs updates from the ID arrays, failure_stats()
+# The conversion of the dicts into a LogBatch is timed on its own, it is paid once per
+# batch however many analyses run on it. The results of both are checked to be equal.
+#
+#   python bench_log_batch.py --logs 1000000
+
+def make_logs(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    logs = []
+    for i in range(count):
+        log = {"id": str(i), "question": f"How do I use feature {rng.randrange(500)}?", "docs": None,
+               "answer": "Use the documented API."}
+        if rng.random() < 0.3:
+            log.update(grade=rng.randrange(2), grader=f"grader-{rng.randrange(5)}", feedback="Wrong docs retrieved.")
+        logs.append(log)
+    return logs
+
+def dict_analysis(logs: list[dict]) -> tuple:
+    from processed_logs import processed_update
+    failures = [log for log in logs if "grade" in log]
+    fa_processed = processed_update("failure-analysis", [failure["id"] for failure in failures])
+    qs_processed = processed_update("summary", [log["id"] for log in logs])
+    by_grader = defaultdict(lambda: [0, 0.0, 0])
+    for failure in failures:
+        if failure.get("grader") is None:
+            continue
+        stats = by_grader[failure["grader"]]
+        stats[0] += 1
+        if failure["grade"] is not None:
+            stats[1] += failure["grade"]
+            stats[2] += 1
+    by_grader = {grader: {"failures": count, "mean_grade": total / scored if scored else None}
+                 for grader, (count, total, scored) in by_grader.items()}
+    return len(failures), fa_processed, qs_processed, by_grader
+
+def columnar_analysis(batch) -> tuple:
+    from processed_logs import processed_update
+    failures = batch.failures()
+    stats = batch.failure_stats()
+    return (len(failures), processed_update("failure-analysis", failures.ids),
+            processed_update("summary", batch.ids), stats["by_grader"])
+
+def timed(fn, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logs", type=int, default=1000000)
+    args = parser.parse_args()
+
+    from log_batch import LogBatch
+
+    logs = make_logs(args.logs)
+    dict_seconds, expected = timed(dict_analysis, logs)
+    convert_seconds, batch = timed(LogBatch.from_logs, logs)
+    columnar_seconds, result = timed(columnar_analysis, batch)
+    assert result[:3] == expected[:3]
+    assert result[3].keys() == expected[3].keys()
+    for grader, stats in expected[3].items():
+        assert stats["failures"] == result[3][grader]["failures"]
+        assert abs(stats["mean_grade"] - result[3][grader]["mean_grade"]) < 1e-9
+
+    print(f"{args.logs:,} logs, {expected[0]:,} failures")
+    print(f"{'dicts':>22}: {dict_seconds:.3f}s")
+    print(f"{'columnar':>22}: {columnar_seconds:.3f}s ({dict_seconds / columnar_seconds:.1f}x)")
+    print(f"{'dicts to LogBatch':>22}: {convert_seconds:.3f}s")
+
+    # Without the processed_logs updates
+    start = time.perf_counter()
+    failures = [log for log in logs if "grade" in log]
+    graders = defaultdict(int)
+    for failure in failures:
+        graders[failure.get("grader")] += 1
+    dict_filter = time.perf_counter() - start
+    start = time.perf_counter()
+    batch.grader_counts(batch.has_grade)
+    columnar_filter = time.perf_counter() - start
+    print(f"{'filter and group only':>22}: dicts {dict_filter:.3f}s, columnar {columnar_filter:.3f}s "
+          f"({dict_filter / columnar_filter:.1f}x)")
+
+if __name__ == "__main__":
+    main()
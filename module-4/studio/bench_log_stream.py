@@ -0,0 +1,68 @@
+"""Compare peak memory and time of one sub-graph run over all logs with chunked streaming."""
+import argparse
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+# Writes --logs synthetic logs (about a third graded, like failures) to a gzipped JSON
+# lines file, then runs the sub_graphs.py pipeline over it twice:
+#   materialized  the whole file loaded into raw_logs, one invoke
+#   streamed      log_stream.ingest_logs, --chunk-size logs per invoke
+# and reports wall time, peak traced memory and processed log entries of each.
+#
+#   python bench_log_stream.py --logs 1000000 --chunk-size 10000
+
+def write_logs(path: str, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for i in range(count):
+            log = {"id": str(i), "question": f"How do I use feature {rng.randrange(500)}?",
+                   "docs": None, "answer": "Use the documented API. " * rng.randrange(1, 6)}
+            if rng.random() < 0.3:
+                log.update(grade=rng.randrange(2), grader=f"grader-{rng.randrange(5)}", feedback="Wrong docs retrieved.")
+            f.write(json.dumps(log) + "\n")
+
+def measure(run) -> tuple[float, float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    processed = run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20, processed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logs", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    from log_stream import ingest_logs, read_log_chunks
+    from processed_logs import processed_count
+    from sub_graphs import graph
+
+    path = os.path.join(tempfile.mkdtemp(), "logs.jsonl.gz")
+    write_logs(path, args.logs)
+    print(f"{args.logs:,} logs, {os.path.getsize(path) / 2 ** 20:.1f}MB gzipped")
+
+    def materialized() -> int:
+        logs = [log for chunk in read_log_chunks(path, args.logs) for log in chunk]
+        return processed_count(graph.invoke({"raw_logs": logs})["processed_logs"])
+
+    def streamed() -> int:
+        return sum(processed_count(result["processed_logs"]) for result in
+                   ingest_logs(path, args.chunk_size, args.concurrency, graph=graph))
+
+    results = {}
+    for label, run in (("materialized", materialized), (f"streamed ({args.chunk_size:,})", streamed)):
+        elapsed, peak, processed = results[label] = measure(run)
+        print(f"{label:>20}: {elapsed:>6.2f}s, peak {peak:>7.1f}MB, {processed:,} processed log entries")
+    assert len({processed for _, _, processed in results.values()}) == 1
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Count model calls of repeated map-reduce runs with memoized nodes."""
+import argparse
+import os
+import tempfile
+import time
+from typing import Optional
+
+# Runs the map-reduce graph offline (FakeChatModel with latency) several times on the
+# same topic, with no memoization, the in-process LRU and a SQLite file, and reports
+# model calls, wall time and memo hits per node. A last run after invalidating
+# generate_joke checks that only the jokes are generated again, and a batched run
+# (joke_batch_concurrency) checks that it shares the entries of the per-branch runs.
+#
+#   python bench_memo.py --runs 3 --latency 0.05
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--subjects", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake model call")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    import map_reduce
+    from fakes import FakeChatModel
+    from memo import LRUBackend, SQLiteBackend
+
+    map_reduce.model = FakeChatModel(array_length=args.subjects, latency=args.latency)
+    directory = tempfile.mkdtemp()
+    backends = {"none": None, "memory": LRUBackend(), "sqlite": SQLiteBackend(os.path.join(directory, "memo.db"))}
+
+    def run(config: Optional[dict] = None) -> tuple[float, int, str]:
+        calls = next(map_reduce.model.calls)
+        start = time.perf_counter()
+        result = map_reduce.graph.invoke({"topic": "animals"}, config)
+        elapsed = time.perf_counter() - start
+        return elapsed, next(map_reduce.model.calls) - calls - 1, result["best_selected_joke"]
+
+    for label, backend in backends.items():
+        map_reduce.memo.backend = backend
+        map_reduce.memo._stats.clear()
+        results = [run() for _ in range(args.runs)]
+        assert len({best for _, _, best in results}) == 1
+        runs = ", ".join(f"{calls} calls {elapsed:.2f}s" for elapsed, calls, _ in results)
+        print(f"{label:>7}: {runs}")
+        if backend is None:
+            continue
+        stats = ", ".join(f"{node} {s['hits']}/{s['hits'] + s['misses']}" for node, s in map_reduce.memo.stats().items())
+        print(f"{'':>7}  hits: {stats}, {len(backend)} entries")
+
+        dropped = map_reduce.memo.invalidate("generate_joke")
+        elapsed, calls, _ = run()
+        print(f"{'':>7}  after invalidating generate_joke ({dropped} entries): {calls} calls {elapsed:.2f}s")
+        assert calls == args.subjects
+
+        elapsed, calls, _ = run({"configurable": {"joke_batch_concurrency": 4}})
+        print(f"{'':>7}  batched jokes: {calls} calls {elapsed:.2f}s")
+        assert calls == 0
+
+if __name__ == "__main__":
+    main()
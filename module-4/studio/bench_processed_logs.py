@@ -0,0 +1,77 @@
+"""Compare the processed_logs string list with the compact ID bitmaps of processed_logs.py."""
+import argparse
+import operator
+import random
+import time
+
+# Feeds --logs log IDs, in chunks of --chunk-size, through the processed_logs channel of
+# sub_graphs.py the way both subgraphs write it: every log gets a summary entry, about
+# a third a failure-analysis entry. Two channel representations are compared:
+#   strings  one "summary-on-log-{id}" string per entry, merged with operator.add
+#   bitmaps  processed_update() ID bitmaps per subgraph, merged with merge_processed
+# The table reports the time to build the updates and to merge them, the size of the
+# final value as a checkpointer serializes it, and the time of --lookups membership
+# checks and of counting the entries.
+#
+#   python bench_processed_logs.py --logs 1000000 --chunk-size 10000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logs", type=int, default=1000000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from processed_logs import is_processed, merge_processed, processed_count, processed_update, render_processed
+
+    rng = random.Random(0)
+    chunks = []
+    for start in range(0, args.logs, args.chunk_size):
+        ids = [str(i) for i in range(start, min(start + args.chunk_size, args.logs))]
+        chunks.append((ids, [log_id for log_id in ids if rng.random() < 0.3]))
+    probes = [str(rng.randrange(args.logs)) for _ in range(args.lookups)]
+    serializer = JsonPlusSerializer()
+
+    def strings():
+        updates = [[f"summary-on-log-{log_id}" for log_id in ids] +
+                   [f"failure-analysis-on-log-{log_id}" for log_id in failures] for ids, failures in chunks]
+        return updates, operator.add, [], (lambda value, log_id: f"summary-on-log-{log_id}" in value), len
+
+    def bitmaps():
+        updates = [merge_processed(processed_update("summary", ids), processed_update("failure-analysis", failures))
+                   for ids, failures in chunks]
+        return updates, merge_processed, {}, (lambda value, log_id: is_processed(value, "summary", log_id)), processed_count
+
+    print(f"{args.logs:,} logs in {len(chunks)} chunks")
+    print(f"{'channel':>8} {'build':>8} {'merge':>8} {'serialized':>13} {'lookups':>9} {'count':>8}")
+    results = {}
+    for label, setup in (("strings", strings), ("bitmaps", bitmaps)):
+        start = time.perf_counter()
+        updates, reducer, value, contains, count = setup()
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for update in updates:
+            value = reducer(value, update)
+        merge = time.perf_counter() - start
+
+        size = len(serializer.dumps_typed(value)[1])
+
+        start = time.perf_counter()
+        hits = sum(contains(value, log_id) for log_id in probes)
+        lookups = time.perf_counter() - start
+
+        start = time.perf_counter()
+        entries = count(value)
+        counting = time.perf_counter() - start
+
+        results[label] = (value, hits, entries)
+        print(f"{label:>8} {build:>7.3f}s {merge:>7.3f}s {size:>12,}B {lookups:>8.4f}s {counting:>7.4f}s")
+
+    (strings_value, strings_hits, strings_count), (bitmaps_value, bitmaps_hits, bitmaps_count) = results.values()
+    assert strings_hits == bitmaps_hits == args.lookups and strings_count == bitmaps_count
+    assert sorted(render_processed(bitmaps_value)) == sorted(strings_value)
+
+if __name__ == "__main__":
+    main()
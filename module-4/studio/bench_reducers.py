@@ -0,0 +1,74 @@
+"""Microbenchmark the list reducers of reducers.py against sorting_reducer and operator.add."""
+import argparse
+import operator
+import random
+import time
+
+# Folds N items, delivered in updates of --batch items (one update per branch write),
+# through each reducer the way a LangGraph channel does: value = reducer(value, update).
+# Every reducer is checked against the result it should have, and the table reports the
+# total time and the time per update. operator.add (unsorted, keeps everything) and
+# sorting_reducer (the full re-sort of parallelization.py) are the baselines. A speedup
+# over sorting_reducer is only shown for reducers with the same output; top_k, dedup
+# and sliding_window keep different items, so they are only timed.
+#
+#   python bench_reducers.py --items 100000 --batches 10,1000
+
+def sorting_reducer(left, right):
+    # As defined in parallelization.py before reducers.py
+    if not isinstance(left, list):
+        left = [left]
+    if not isinstance(right, list):
+        right = [right]
+    return sorted(left + right, reverse=False)
+
+def fold(reducer, updates: list) -> tuple[float, list]:
+    value = []
+    start = time.perf_counter()
+    for update in updates:
+        value = reducer(value, update)
+    return time.perf_counter() - start, value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--batches", default="10,1000", help="Items per update")
+    parser.add_argument("--k", type=int, default=100, help="top_k size")
+    parser.add_argument("--window", type=int, default=1000, help="sliding_window size")
+    args = parser.parse_args()
+
+    from reducers import dedup_by_key, sliding_window, sorted_merge, top_k
+
+    rng = random.Random(0)
+    # Half as many distinct values as items, so dedup_by_key has duplicates to drop
+    items = [rng.randrange(args.items // 2) for _ in range(args.items)]
+    unique = list(dict.fromkeys(items))
+    reducers = {
+        "operator.add": (operator.add, items),
+        "sorting_reducer": (sorting_reducer, sorted(items)),
+        "sorted_merge": (sorted_merge, sorted(items)),
+        f"top_k({args.k})": (top_k(args.k), sorted(items, reverse=True)[:args.k]),
+        "dedup_by_key": (dedup_by_key(), unique),
+        "dedup_by_key(last)": (dedup_by_key(keep="last"), unique),
+        f"sliding_window({args.window})": (sliding_window(args.window), items[-args.window:]),
+    }
+
+    print(f"{args.items:,} items")
+    print(f"{'batch':>6} {'reducer':>22} {'total':>9} {'per update':>11} {'length':>8} {'vs sorting_reducer':>19}")
+    for batch in [int(b) for b in args.batches.split(",")]:
+        updates = [items[i:i + batch] for i in range(0, len(items), batch)]
+        baseline = None
+        for label, (reducer, expected) in reducers.items():
+            elapsed, value = fold(reducer, updates)
+            assert value == expected, label
+            if label == "sorting_reducer":
+                baseline, ratio = elapsed, "-"
+            elif baseline and expected == reducers["sorting_reducer"][1]:
+                ratio = f"{baseline / elapsed:.1f}x faster"
+            else:
+                ratio = "different output"
+            print(f"{batch:>6} {label:>22} {elapsed:>8.3f}s {elapsed / len(updates) * 1e6:>9.1f}us "
+                  f"{len(value):>8,} {ratio:>19}")
+
+if __name__ == "__main__":
+    main()
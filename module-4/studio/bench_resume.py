@@ -0,0 +1,74 @@
+"""Compare resuming a research run with a failed interview against running it again."""
+import argparse
+import os
+
+# Runs the research graph offline (fake model and searches) with one analyst's interview
+# failing at its last node, then counts the model calls needed to finish the report by
+# resuming the thread versus starting the run over.
+#
+#   python bench_resume.py --analysts 5 --turns 3
+
+def start(graph, config: dict, analysts: int, turns: int, before_interviews=None):
+    graph.invoke({"topic": "Resuming runs", "max_analysts": analysts, "max_num_turns": turns}, config)
+    if before_interviews:
+        before_interviews(graph.get_state(config).values["analysts"])
+    graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+    return graph.invoke(None, config)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysts", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from langgraph.checkpoint.memory import MemorySaver
+    import research_assistant
+    from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+    from resume import interview_status, resume_interviews
+
+    class FlakyChatModel(FakeChatModel):
+        """ Fails the section writer of one analyst until it is fixed """
+        broken_focus: str = ""
+        count: int = 0
+
+        def _generate(self, messages, *args, **kwargs):
+            prompt = str(messages[0].content)
+            if self.broken_focus and "technical writer" in prompt and self.broken_focus in prompt:
+                raise ConnectionError("provider unavailable")
+            self.count += 1
+            return super()._generate(messages, *args, **kwargs)
+
+    llm = FlakyChatModel(array_length=args.analysts)
+    research_assistant.llm = llm
+    research_assistant.TavilySearchResults = FakeTavilySearch
+    research_assistant.WikipediaLoader = FakeWikipediaLoader
+
+    def break_last(analysts: list):
+        llm.broken_focus = analysts[-1].description
+
+    graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": "flaky"}}
+    try:
+        start(graph, config, args.analysts, args.turns, before_interviews=break_last)
+    except ConnectionError:
+        pass
+    first = llm.count
+    for branch in interview_status(graph, config):
+        print(f"  {branch['analyst']}: {branch['status']}" + (f" ({branch['error']})" if branch["error"] else ""))
+
+    llm.broken_focus = ""
+    result = resume_interviews(graph, config)
+    resumed = llm.count - first
+
+    rerun_graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+    before = llm.count
+    rerun = start(rerun_graph, {"configurable": {"thread_id": "rerun"}}, args.analysts, args.turns)
+    rerun_calls = llm.count - before
+
+    assert len(result["sections"]) == len(rerun["sections"]) == args.analysts
+    print(f"{args.analysts} analysts, {args.turns} turns: failed attempt made {first} model calls")
+    print(f"  resume: {resumed} model calls, run again: {rerun_calls} model calls")
+
+if __name__ == "__main__":
+    main()
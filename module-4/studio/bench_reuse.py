@@ -0,0 +1,50 @@
+"""Measure model calls saved by the cross-run reuse index on recurring topics."""
+import argparse
+import os
+import tempfile
+
+# Runs the research graph offline (fake model and searches) on one topic to fill a fresh
+# reuse index, then on a rephrased topic and an unrelated one with reuse enabled, and
+# reports the model calls of each run.
+#
+#   python bench_reuse.py --analysts 4 --min-similarity 0.5
+
+TOPICS = [
+    ("first run", "The benefits of adopting LangGraph as an agent framework"),
+    ("similar topic", "Benefits of adopting LangGraph as the agent framework for a team"),
+    ("unrelated topic", "History of the printing press in early modern Europe"),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysts", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--min-similarity", type=float, default=0.5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ["RESEARCH_REUSE_INDEX"] = os.path.join(tempfile.mkdtemp(), "reuse.sqlite")
+    from langgraph.checkpoint.memory import MemorySaver
+    import research_assistant
+    from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+    from reuse_index import signature, similarity
+
+    llm = FakeChatModel(array_length=args.analysts)
+    research_assistant.llm = llm
+    research_assistant.TavilySearchResults = FakeTavilySearch
+    research_assistant.WikipediaLoader = FakeWikipediaLoader
+
+    for name, topic in TOPICS:
+        graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+        config = {"configurable": {"thread_id": name, "reuse_min_similarity": args.min_similarity}}
+        calls = next(llm.calls)
+        graph.invoke({"topic": topic, "max_analysts": args.analysts, "max_num_turns": args.turns}, config)
+        graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+        result = graph.invoke(None, config)
+        calls = next(llm.calls) - calls - 1
+        score = similarity(signature(TOPICS[0][1]), signature(topic))
+        print(f"{name:>16}: {calls:>3} model calls, {len(result['sections'])} sections, "
+              f"topic similarity {score:.2f}, index {research_assistant.reuse_index.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure how much interview latency speculative interviews hide behind human review."""
+import argparse
+import os
+import time
+
+# Runs the research graph offline (fake model and searches, with latency per model call)
+# and waits `--review` seconds at the human_feedback interrupt before approving, like a
+# human reading the proposed analysts. Reports the time from approval to the final
+# report and the model calls made, without speculation, with it, and with one round of
+# targeted feedback (the replaced analyst's speculative interview is discarded). A
+# RunBudget in the run callbacks checks that speculative model calls are counted too.
+#
+#   python bench_speculation.py --analysts 4 --latency 0.05 --review 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analysts", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake model call")
+    parser.add_argument("--review", type=float, default=1.0, help="Seconds the human takes to review")
+    parser.add_argument("--cap", type=int, default=1_000_000, help="speculation_max_tokens")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    from langgraph.checkpoint.memory import MemorySaver
+    import research_assistant
+    from budget import RunBudget
+    from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+
+    llm = FakeChatModel(array_length=args.analysts, latency=args.latency)
+    research_assistant.llm = llm
+    research_assistant.TavilySearchResults = FakeTavilySearch
+    research_assistant.WikipediaLoader = FakeWikipediaLoader
+
+    def run(name: str, cap: int, feedback: dict = None):
+        graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+        budget = RunBudget()
+        config = {"configurable": {"thread_id": name, "speculation_max_tokens": cap}, "callbacks": [budget]}
+        calls = next(llm.calls)
+        graph.invoke({"topic": "Speculative interviews", "max_analysts": args.analysts,
+                      "max_num_turns": args.turns}, config)
+        if feedback:
+            time.sleep(args.review)
+            target = graph.get_state(config).values["analysts"][-1].name
+            graph.update_state(config, {"analyst_feedback": {target: feedback}}, as_node="human_feedback")
+            graph.invoke(None, config)
+        time.sleep(args.review)
+        start = time.perf_counter()
+        graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+        result = graph.invoke(None, config)
+        elapsed = time.perf_counter() - start
+        calls = next(llm.calls) - calls - 1
+        assert len(result["sections"]) == args.analysts
+        assert budget.calls == calls
+        assert name not in research_assistant.speculator._threads
+        print(f"{name:>22}: {elapsed:.2f}s from approval to report, {calls} model calls, "
+              f"speculation {research_assistant.speculator.stats(name)}")
+
+    run("no speculation", 0)
+    run("speculation", args.cap)
+    run("speculation + feedback", args.cap, feedback="Focus on operating costs instead.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+# Content-addressed storage for retrieved documents.
+#
+# Retrieval nodes store each document once and only put its reference into state, so
+# checkpoints carry a short "blob:<hash>" string instead of the full text every time the
+# context channel is serialized. References are resolved when a prompt is built.
+#
+# Offloading is opt-in: set RESEARCH_BLOB_DIR to keep the documents in files under that
+# directory, where they outlive the process like the checkpoints that refer to them.
+# Without it, put() returns the text itself and documents stay inline in state. Recently
+# used blobs are cached in memory, up to cache_size of them.
+
+REF_PREFIX = "blob:"
+HASH_LENGTH = 32
+
+class BlobStore:
+
+    def __init__(self, directory: Optional[str] = None, cache_size: int = 256):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "BlobStore":
+        return cls(os.environ.get("RESEARCH_BLOB_DIR") or None)
+
+    @staticmethod
+    def is_ref(value) -> bool:
+        return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _remember(self, digest: str, text: str):
+        with self._lock:
+            self._cache[digest] = text
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def put(self, text: str) -> str:
+        """ Store a document and return its reference, or the text itself without a directory """
+        if not self.directory:
+            return text
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:HASH_LENGTH]
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temporary name first, so a reader never sees half a blob
+            partial = f"{path}.{threading.get_ident()}.tmp"
+            with open(partial, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(partial, path)
+        self._remember(digest, text)
+        return REF_PREFIX + digest
+
+    def get(self, ref: str) -> str:
+        """ Text of a reference. Plain strings are returned unchanged """
+        if not self.is_ref(ref):
+            return ref
+        digest = ref[len(REF_PREFIX):]
+        with self._lock:
+            text = self._cache.get(digest)
+            if text is not None:
+                self._cache.move_to_end(digest)
+                return text
+        if not self.directory or not os.path.exists(self._path(digest)):
+            raise KeyError(f"Unknown blob {ref}, it was stored under a RESEARCH_BLOB_DIR this process does not use")
+        with open(self._path(digest), encoding="utf-8") as f:
+            text = f.read()
+        self._remember(digest, text)
+        return text
+
+    def resolve(self, refs: Iterable[str]) -> list[str]:
+        """ Texts of the references in order, each document once """
+        return [self.get(ref) for ref in dict.fromkeys(refs)]
+
+    def _files(self) -> list[str]:
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(root, name) for root, _, names in os.walk(self.directory)
+                for name in names if not name.endswith(".tmp")]
+
+    def __len__(self) -> int:
+        return len(self._files())
+
+    def nbytes(self) -> int:
+        return sum(os.path.getsize(path) for path in self._files())
@@ -0,0 +1,243 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs, set_config_context
+
+import configuration
+
+# Run-level token / wall-clock budget.
+#
+# A RunBudget is a callback handler, so passing it in the run config makes every LLM
+# call of every Send() branch and subgraph report its token usage to the same object:
+#
+#   budget = RunBudget(max_tokens=200_000, max_seconds=120)
+#   graph.invoke(None, {"configurable": {...}, "callbacks": [budget]})
+#
+# The clock only runs while an invoke is in progress: time spent between invokes, like
+# the human review at an interrupt, does not count against max_seconds.
+#
+# Without a RunBudget in the callbacks, the run_max_tokens and run_max_seconds fields of
+# the Configuration set up one per thread, kept by run_budgets. The nodes of the research
+# graph are wrapped with budgeted(), which adds run_budgets to the callbacks of the node
+# and runs its clock while the node runs. This is done per node rather than per graph:
+# callbacks given at compile time are replaced by any given to invoke, a profiler say.
+#
+# Nodes look it up with budget_level(config) and scale their work down as the budget
+# runs out (see research_assistant.py).
+
+OK = "ok"
+LOW = "low"
+EXHAUSTED = "exhausted"
+
+class RunBudget(BaseCallbackHandler):
+    """ Tokens and wall-clock time shared by all branches of a run """
+
+    def __init__(self, max_tokens: Optional[int] = None, max_seconds: Optional[float] = None,
+                 low_watermark: float = 0.5, reserve: float = 0.2):
+        # Below low_watermark of the budget left nodes cut optional work, below reserve
+        # interviews wrap up so the report writers still have room to finish
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.low_watermark = low_watermark
+        self.reserve = reserve
+        self.seconds = 0.0 # Time spent with runs in progress, the current stretch excluded
+        self._active: set = set() # Chain runs in progress
+        self._outermost: set = set() # Runs in progress whose parent is not known here
+        self._since: Optional[float] = None # Start of the current stretch with runs in progress
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Optional[RunnableConfig]) -> Optional["RunBudget"]:
+        """ The budget registered in the run callbacks, if any """
+        callbacks = (config or {}).get("callbacks")
+        handlers = getattr(callbacks, "handlers", callbacks) or []
+        return next((handler for handler in handlers if isinstance(handler, cls)), None)
+
+    def on_chain_start(self, serialized: Optional[dict], inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        with self._lock:
+            # A run whose parent is not known here is an invoke of the graph
+            if parent_run_id is None or parent_run_id not in self._active:
+                self._open(run_id)
+            self._active.add(run_id)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._active.discard(run_id)
+            self._close(run_id)
+
+    # Overlapping runs (parallel nodes, speculative interviews) count their time once
+
+    def _open(self, key):
+        if not self._outermost:
+            self._since = time.monotonic()
+        self._outermost.add(key)
+
+    def _close(self, key):
+        if key in self._outermost:
+            self._outermost.discard(key)
+            if not self._outermost:
+                self.seconds += time.monotonic() - self._since
+                self._since = None
+
+    @contextmanager
+    def span(self):
+        """ Run the clock for the duration of the block """
+        key = object()
+        with self._lock:
+            self._open(key)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._close(key)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.on_chain_end(None, run_id=run_id)
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.calls += 1
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def elapsed(self) -> float:
+        """ Seconds spent in invokes so far, the one in progress included """
+        with self._lock:
+            running = time.monotonic() - self._since if self._since is not None else 0.0
+            return self.seconds + running
+
+    def remaining(self) -> float:
+        """ Fraction of the tightest budget left, 1.0 when unlimited """
+        fractions = [1.0]
+        if self.max_tokens:
+            fractions.append(1 - self.tokens / self.max_tokens)
+        if self.max_seconds:
+            fractions.append(1 - self.elapsed / self.max_seconds)
+        return max(0.0, min(fractions))
+
+    def level(self) -> str:
+        remaining = self.remaining()
+        if remaining <= self.reserve:
+            return EXHAUSTED
+        if remaining <= self.low_watermark:
+            return LOW
+        return OK
+
+    def summary(self) -> dict:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "elapsed": round(self.elapsed, 3),
+            "remaining": round(self.remaining(), 3),
+            "level": self.level(),
+        }
+
+class RunBudgets(BaseCallbackHandler):
+    """ RunBudget per thread from the run_max_* Configuration fields """
+
+    # Budgets of this many threads are kept, the least recently run ones are dropped
+    MAX_THREADS = 1024
+
+    def __init__(self):
+        self.budgets: OrderedDict[str, RunBudget] = OrderedDict()
+        self._calls: dict = {} # Run ID of every model call in progress -> its budget
+        self._lock = threading.Lock()
+
+    def budget(self, config: Optional[RunnableConfig]) -> Optional[RunBudget]:
+        """ Budget of the thread a config belongs to, None for threads without limits """
+        thread_id = (config or {}).get("configurable", {}).get("thread_id")
+        if not thread_id:
+            return None
+        # Limits are read at every lookup, a resumed thread can change them
+        configurable = configuration.Configuration.from_runnable_config(config)
+        with self._lock:
+            budget = self.budgets.pop(str(thread_id), None)
+            if budget is None and not (configurable.run_max_tokens or configurable.run_max_seconds):
+                return None
+            budget = budget or RunBudget()
+            budget.max_tokens = configurable.run_max_tokens or None
+            budget.max_seconds = configurable.run_max_seconds or None
+            self.budgets[str(thread_id)] = budget
+            while len(self.budgets) > self.MAX_THREADS:
+                self.budgets.popitem(last=False)
+            return budget
+
+    def _start(self, run_id: UUID, metadata: Optional[dict]):
+        # The configurable values of the run, thread_id included, are in the metadata
+        budget = self.budget({"configurable": metadata or {}})
+        if budget is not None:
+            with self._lock:
+                self._calls[run_id] = budget
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID,
+                            metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized: dict, prompts: list, *, run_id: UUID,
+                     metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        self._start(run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            budget = self._calls.pop(run_id, None)
+        if budget is not None:
+            budget.on_llm_end(response)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._calls.pop(run_id, None)
+
+run_budgets = RunBudgets()
+
+def budgeted(node: Callable) -> Callable:
+    """ Node that reports its model calls, and its time, to the budget of its thread """
+    takes_config = "config" in inspect.signature(node).parameters
+
+    @functools.wraps(node)
+    def run(state, config: RunnableConfig):
+        budget = run_budgets.budget(config)
+        if budget is None:
+            return node(state, config) if takes_config else node(state)
+        callbacks = config.get("callbacks")
+        if run_budgets not in (getattr(callbacks, "handlers", callbacks) or []):
+            config = merge_configs(config, {"callbacks": [run_budgets]})
+        # Model calls in the node pick their callbacks up from the config context
+        with budget.span(), set_config_context(config) as context:
+            return context.run(node, state, config) if takes_config else context.run(node, state)
+
+    # LangGraph passes the config to nodes whose signature asks for it
+    state = next(iter(inspect.signature(node).parameters.values()))
+    run.__signature__ = inspect.Signature([
+        state.replace(kind=inspect.Parameter.POSITIONAL_OR_KEYWORD),
+        inspect.Parameter("config", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=RunnableConfig)])
+    return run
+
+def budget_level(config: Optional[RunnableConfig]) -> str:
+    """ Budget level of the run, OK when no budget was given or configured """
+    budget = RunBudget.from_config(config) or run_budgets.budget(config)
+    return budget.level() if budget else OK
@@ -0,0 +1,201 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Optional
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict
+
+from wrapped_models import through
+
+# Record / replay of every LLM call and search result of a graph run.
+#
+# A cassette is a gzipped JSON file mapping a hash of each request to the list of
+# responses it received (in call order) and how long each one took. In replay mode
+# responses are served from the file, optionally with injected latency, so the
+# graph can be benchmarked and regression-tested without OpenAI, Tavily or Wikipedia.
+#
+# Enable it with environment variables before the graph module is imported:
+#   RESEARCH_CASSETTE=runs/syria.cassette.json.gz
+#   RESEARCH_CASSETTE_MODE=record | replay
+#   RESEARCH_CASSETTE_LATENCY=0.5         (seconds added to every replayed call)
+#   RESEARCH_CASSETTE_LATENCY_SCALE=1.0   (multiplier on the recorded call duration)
+
+class CassetteMiss(KeyError):
+    """ Raised in replay mode when a request was never recorded """
+
+def request_key(kind: str, request: Any) -> str:
+    """ Stable hash of a request """
+    payload = json.dumps([kind, request], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def _message_request(message: BaseMessage) -> dict:
+    # Message ids are random per run, so only the content that reaches the model is hashed
+    return {
+        "type": message.type,
+        "content": message.content,
+        "name": message.name,
+        "tool_calls": getattr(message, "tool_calls", None) or None,
+    }
+
+class Cassette:
+
+    def __init__(self, path: Optional[str] = None, mode: str = "off",
+                 latency: float = 0.0, latency_scale: float = 0.0):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.entries: dict[str, list[dict]] = defaultdict(list)
+        self._cursors: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self.load()
+        elif mode == "record":
+            atexit.register(self.save)
+
+    @classmethod
+    def from_env(cls) -> "Cassette":
+        path = os.environ.get("RESEARCH_CASSETTE")
+        if not path:
+            return cls()
+        return cls(path,
+                   mode=os.environ.get("RESEARCH_CASSETTE_MODE", "replay"),
+                   latency=float(os.environ.get("RESEARCH_CASSETTE_LATENCY", 0)),
+                   latency_scale=float(os.environ.get("RESEARCH_CASSETTE_LATENCY_SCALE", 0)))
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            self.entries = defaultdict(list, json.load(f))
+        self.rewind()
+
+    def rewind(self):
+        """ Serve repeated requests from the first recorded response again """
+        with self._lock:
+            self._cursors.clear()
+
+    def save(self):
+        if self.mode != "record" or not self.path:
+            return
+        with self._lock:
+            entries = dict(self.entries)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            json.dump(entries, f, separators=(",", ":"))
+
+    def play(self, kind: str, request: Any, fn: Callable[[], Any],
+             encode: Callable[[Any], Any] = lambda value: value,
+             decode: Callable[[Any], Any] = lambda value: value) -> Any:
+        """ Run fn(), recording or replaying its result depending on the mode """
+        if self.mode == "off":
+            return fn()
+
+        key = request_key(kind, request)
+        if self.mode == "record":
+            start = time.perf_counter()
+            value = fn()
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.entries[key].append({"kind": kind, "elapsed": round(elapsed, 4), "value": encode(value)})
+            return value
+
+        with self._lock:
+            recorded = self.entries.get(key)
+            if not recorded:
+                raise CassetteMiss(f"No recorded {kind} response for request {key}")
+            # Repeated identical requests replay in recorded order, the last one sticks
+            index = min(self._cursors[key], len(recorded) - 1)
+            self._cursors[key] += 1
+            entry = recorded[index]
+        delay = self.latency + self.latency_scale * entry["elapsed"]
+        if delay > 0:
+            time.sleep(delay)
+        return decode(entry["value"])
+
+    def chat_model(self, factory: Callable[[], BaseChatModel]) -> BaseChatModel:
+        """ Wrap a chat model. The real model is never built in replay mode """
+        if self.mode == "off":
+            return factory()
+        model = factory() if self.mode == "record" else None
+        return CassetteChatModel(model=model, cassette=self)
+
+    def search(self, kind: str, query: str, fn: Callable[[], list]) -> list:
+        """ Record / replay a search that returns result dicts or Documents """
+        return self.play(kind, query, fn, encode=_encode_results, decode=_decode_results)
+
+    def stats(self) -> dict:
+        counts = defaultdict(int)
+        for recorded in self.entries.values():
+            for entry in recorded:
+                counts[entry["kind"]] += 1
+        return dict(counts)
+
+def _encode_results(results: list) -> list:
+    return [
+        {"document": {"page_content": r.page_content, "metadata": r.metadata}} if isinstance(r, Document) else r
+        for r in results
+    ]
+
+def _decode_results(results: list) -> list:
+    return [Document(**r["document"]) if isinstance(r, dict) and "document" in r else r for r in results]
+
+class CassetteChatModel(BaseChatModel):
+    """ Chat model that records the wrapped model's responses, or replays them """
+
+    model: Optional[BaseChatModel] = None
+    cassette: Cassette
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tools while recording, so the live request is unchanged
+        if self.model is not None:
+            return through(self.model.bind_tools(tools, **kwargs), self.model, self)
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def with_structured_output(self, schema, **kwargs):
+        # While recording, the wrapped model picks the method, tool_choice and parser, as it
+        # would without the cassette, and only its calls go through this model
+        if self.model is not None:
+            return through(self.model.with_structured_output(schema, **kwargs), self.model, self)
+        # Replay has no wrapped model: the tool call it recorded (ChatOpenAI's default
+        # method) is parsed by the same parser, any other method could not be
+        if kwargs.get("method", "function_calling") != "function_calling":
+            raise NotImplementedError(f"Replaying with_structured_output(method={kwargs['method']!r}) is not supported")
+        return super().with_structured_output(schema, **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        kwargs.pop("ls_structured_output_format", None)
+        # Tools are keyed by name only, replay formats them without the wrapped model
+        tools = sorted(tool["function"]["name"] for tool in kwargs.get("tools", []))
+        request = {"messages": [_message_request(m) for m in messages], "stop": stop, "tools": tools}
+
+        def call():
+            return self.model._generate(messages, stop=stop, **kwargs)
+
+        def encode(result: ChatResult) -> dict:
+            return {
+                "generations": [message_to_dict(g.message) for g in result.generations],
+                "llm_output": result.llm_output,
+            }
+
+        def decode(value: dict) -> ChatResult:
+            generations = [ChatGeneration(message=m) for m in messages_from_dict(value["generations"])]
+            return ChatResult(generations=generations, llm_output=value["llm_output"])
+
+        return self.cassette.play("llm", request, call, encode=encode, decode=decode)
@@ -0,0 +1,65 @@
+import hashlib
+import re
+
+# Sources are registered once, when they are retrieved. Each one gets a short ID
+# derived from its link, so the same URL always maps to the same ID no matter which
+# analyst branch retrieved it. Prompts only ever see the IDs; the numbered
+# bibliography is assembled deterministically at the end of the run.
+
+ID_PREFIX = "S"
+ID_LENGTH = 6
+
+# Matches [S1a2b3c] as well as grouped citations like [S1a2b3c, S4d5e6f]
+_ID = rf"{ID_PREFIX}[0-9a-f]{{{ID_LENGTH}}}"
+CITATION_PATTERN = re.compile(rf"\[\s*({_ID}(?:\s*[,;]\s*{_ID})*)\s*\]")
+
+def source_id(link: str) -> str:
+    """ Stable short ID for a URL or document path """
+    digest = hashlib.sha1(link.strip().encode("utf-8")).hexdigest()
+    return ID_PREFIX + digest[:ID_LENGTH]
+
+def web_source(doc: dict) -> tuple[str, str]:
+    """ Register a Tavily search result, returns (id, label) """
+    link = doc["url"]
+    return source_id(link), link
+
+def document_source(metadata: dict) -> tuple[str, str]:
+    """ Register a loaded document (e.g. Wikipedia), returns (id, label) """
+    link = metadata["source"]
+    page = metadata.get("page", "")
+    label = f"{link}, page {page}" if page != "" else link
+    return source_id(label), label
+
+def merge_sources(left: dict | None, right: dict | None) -> dict:
+    """ Reducer for the sources channel: IDs are content derived so merging is a plain union """
+    if not left:
+        return dict(right or {})
+    if not right:
+        return left
+    return {**left, **right}
+
+def cited_ids(text: str) -> list[str]:
+    """ Source IDs in order of first citation """
+    seen = {}
+    for match in CITATION_PATTERN.finditer(text):
+        for sid in re.findall(_ID, match.group(1)):
+            seen.setdefault(sid, None)
+    return list(seen)
+
+def build_bibliography(text: str, sources: dict) -> tuple[str, str]:
+    """ Renumber ID citations to [1], [2], ... in order of appearance and render the Sources list
+
+    Citations to IDs that were never registered (i.e. invented by the model) are dropped.
+    """
+    numbers = {}
+    for sid in cited_ids(text):
+        if sid in sources:
+            numbers[sid] = len(numbers) + 1
+
+    def renumber(match: re.Match) -> str:
+        ids = re.findall(_ID, match.group(1))
+        return "".join(f"[{numbers[sid]}]" for sid in dict.fromkeys(ids) if sid in numbers)
+
+    text = CITATION_PATTERN.sub(renumber, text)
+    bibliography = "\n".join(f"[{n}] {sources[sid]}  " for sid, n in numbers.items())
+    return text, bibliography
@@ -0,0 +1,38 @@
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+@dataclass(kw_only=True)
+class Configuration:
+    """The configurable fields for the research assistant and the other studio graphs."""
+    max_concurrent_interviews: int = 0 # 0 means every analyst is interviewed at once
+    retrieval_deadline: float = 0 # Seconds to wait for search providers, 0 waits for all of them
+    straggler_timeout: float = 0 # Seconds to wait, after the answer, for searches that missed retrieval_deadline, 0 keeps only the finished ones (parallelization.py)
+    retrieval_min_results: int = 0 # Proceed once this many documents arrived, 0 waits for all providers
+    context_max_chars: int = 32000 # Character budget for the source documents in a prompt, 0 is unlimited
+    speculation_max_tokens: int = 0 # Tokens interviews may spend while the analysts wait for review, 0 disables speculation
+    reuse_min_similarity: float = 0 # Reuse analysts and interviews of past runs at least this similar (0 to 1), 0 disables reuse
+    context_compression: int = 0 # Interview turns kept in full in prompts, older ones are compressed into a digest, 0 disables
+    run_max_tokens: int = 0 # Token budget of a run (all invokes of a thread), interviews get shorter as it runs out, 0 is unlimited
+    run_max_seconds: float = 0 # Seconds the invokes of a run may take, time waiting at the interrupt excluded, 0 is unlimited
+    joke_batch_concurrency: int = 0 # Generate all jokes in one batched call with this many in flight, 0 sends one branch per subject (map_reduce.py)
+    joke_bracket_size: int = 0 # Pick the best joke in brackets of this many while jokes are generated, 0 compares all at once (map_reduce.py)
+
+    @classmethod
+    def from_runnable_config(
+        cls, config: Optional[RunnableConfig] = None
+    ) -> "Configuration":
+        """Create a Configuration instance from a RunnableConfig."""
+        configurable = (
+            config["configurable"] if config and "configurable" in config else {}
+        )
+        values: dict[str, Any] = {
+            f.name: os.environ.get(f.name.upper(), configurable.get(f.name))
+            for f in fields(cls)
+            if f.init
+        }
+        # Environment variables are strings, cast them to the field type
+        types = {f.name: f.type for f in fields(cls)}
+        return cls(**{k: types[k](v) for k, v in values.items() if v is not None and v != ""})
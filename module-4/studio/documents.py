@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+# Retrieved documents travel through state as small typed records. The text itself
+# lives in the blob store when one is configured; formatting into the <Document> blocks
+# the prompts expect happens once, when a prompt is assembled, and can be ranked,
+# de-duplicated and cut to a character budget there without reparsing strings.
+
+@dataclass(frozen=True, slots=True)
+class SourceDocument:
+    id: str # Citation ID (see citations.py)
+    source: str # URL or document path
+    page: str # Page within the source, if any
+    blob: str # Blob store reference of the text, the text itself without a blob directory
+    score: float # Provider relevance score, higher is better
+
+def provider_scores(metadatas: list[dict]) -> list[float]:
+    """ Relevance of one provider's results, in 0..1 with the best result at 1
+
+    Providers score on different scales (Tavily 0 to 1, raw BM25 for the Wikipedia
+    snapshot), so their scores are divided by the best one of the response. Results
+    without a score (e.g. the Wikipedia API) are scored by rank instead.
+    """
+    scores = [metadata.get("score") for metadata in metadatas]
+    if scores and None not in scores and max(scores) > 0:
+        return [max(0.0, float(score)) / max(scores) for score in scores]
+    return [1.0 / (rank + 1) for rank in range(len(metadatas))]
+
+def _ranked(documents: Iterable[SourceDocument], current: int) -> list[tuple[int, SourceDocument]]:
+    # (0 for this turn's documents, 1 for earlier ones, document), each source once
+    documents = list(documents)
+    split = len(documents) - min(max(current, 0), len(documents))
+    best = {}
+    for position, document in enumerate(documents):
+        entry = (0 if position >= split else 1, document)
+        key = (document.id, document.blob)
+        if key not in best or (entry[0], -document.score) < (best[key][0], -best[key][1].score):
+            best[key] = entry
+    return sorted(best.values(), key=lambda entry: (entry[0], -entry[1].score))
+
+def select_documents(documents: Iterable[SourceDocument], current: int = 0) -> list[SourceDocument]:
+    """ Each source once (best scoring copy), the last current documents first, then best first, ties in retrieval order """
+    return [document for _, document in _ranked(documents, current)]
+
+def format_documents(documents: Iterable[SourceDocument], resolve: Callable[[str], str],
+                     max_chars: int = 0, current: int = 0) -> str:
+    """ Render documents for a prompt, best first, stopping at max_chars (0 = no limit)
+
+    The last current documents are the ones retrieved for the question being answered:
+    they come first and are always kept, the budget only cuts the earlier ones.
+    """
+    blocks, used = [], 0
+    for turn, document in _ranked(documents, current):
+        block = f'<Document id="{document.id}"/>\n{resolve(document.blob)}\n</Document>'
+        if max_chars and turn and blocks and used + len(block) > max_chars:
+            break
+        blocks.append(block)
+        used += len(block)
+    return "\n\n---\n\n".join(blocks)
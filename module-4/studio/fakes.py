@@ -0,0 +1,120 @@
+import hashlib
+import itertools
+import re
+import time
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from text_utils import filler_text
+
+# Offline stand-ins for ChatOpenAI, TavilySearchResults and WikipediaLoader, used by the
+# benchmarks. Responses are deterministic functions of the request, so runs are repeatable.
+
+def _sample(schema: dict, defs: dict, seed: str, array_length: int) -> Any:
+    """ A value that validates against a JSON schema """
+    if "$ref" in schema:
+        return _sample(defs[schema["$ref"].split("/")[-1]], defs, seed, array_length)
+    if "anyOf" in schema:
+        return _sample(schema["anyOf"][0], defs, seed, array_length)
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _sample(prop, defs, f"{seed}.{name}", array_length)
+                for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_sample(schema["items"], defs, f"{seed}.{i}", array_length) for i in range(array_length)]
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return f"{seed.rsplit('.', 1)[-1]} {hashlib.sha1(seed.encode()).hexdigest()[:6]}"
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class FakeChatModel(BaseChatModel):
+    """ Chat model that answers instantly (or after latency seconds) without a provider
+
+    Structured output requests get a schema-valid tool call, plain requests get
+    reply_chars of text citing the first few source IDs found in the prompt.
+    """
+
+    reply_chars: int = 1200
+    array_length: int = 3
+    latency: float = 0.0
+    calls: Any = None
+
+    def model_post_init(self, _):
+        self.calls = itertools.count()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        next(self.calls)
+        prompt = "\n".join(str(m.content) for m in messages)
+        seed = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+        if tools:
+            function = tools[0]["function"]
+            parameters = function["parameters"]
+            args = _sample(parameters, parameters.get("$defs", {}), seed, self.array_length)
+            message = AIMessage(content="", tool_calls=[{"name": function["name"], "args": args, "id": f"call_{seed}"}])
+            output = str(args)
+        else:
+            cited = dict.fromkeys(re.findall(r"S[0-9a-f]{6}", prompt))
+            citations = "".join(f"[{sid}]" for sid in list(cited)[:4])
+            output = filler_text(seed, self.reply_chars) + " " + citations
+            message = AIMessage(content=output)
+        message.usage_metadata = {
+            "input_tokens": approx_tokens(prompt),
+            "output_tokens": approx_tokens(output),
+            "total_tokens": approx_tokens(prompt) + approx_tokens(output),
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+class FakeTavilySearch:
+    """ TavilySearchResults stand-in. Results are drawn from a fixed pool of pages, so
+    different queries return overlapping documents like a real search engine """
+
+    pool_size = 40
+    content_chars = 1500
+
+    def __init__(self, max_results: int = 3, **kwargs):
+        self.max_results = max_results
+
+    def invoke(self, query: str) -> list[dict]:
+        results = []
+        for i in range(self.max_results):
+            page = int(hashlib.sha1(f"{query}:{i}".encode()).hexdigest(), 16) % self.pool_size
+            url = f"https://example.com/articles/{page}"
+            results.append({"url": url, "content": filler_text(url, self.content_chars)})
+        return results
+
+class FakeWikipediaLoader:
+    """ WikipediaLoader stand-in, pages are 4000 characters like the loader's default cap """
+
+    pool_size = 20
+    content_chars = 4000
+
+    def __init__(self, query: str, load_max_docs: int = 2, **kwargs):
+        self.query = query
+        self.load_max_docs = load_max_docs
+
+    def load(self) -> list[Document]:
+        documents = []
+        for i in range(self.load_max_docs):
+            page = int(hashlib.sha1(f"{self.query}:{i}".encode()).hexdigest(), 16) % self.pool_size
+            source = f"https://en.wikipedia.org/wiki/Page_{page}"
+            documents.append(Document(page_content=filler_text(source, self.content_chars),
+                                      metadata={"source": source, "title": f"Page {page}"}))
+        return documents
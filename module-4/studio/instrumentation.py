@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# Per node / per analyst branch profile of a graph run.
+#
+# GraphProfiler is a callback handler, pass it in the run config and it sees every node
+# of the outer builder and of interview_builder, in every Send() branch:
+#
+#   profiler = GraphProfiler()
+#   graph.invoke(None, {"configurable": {...}, "callbacks": [profiler]})
+#   profiler.save("run.profile.json")
+#   print(profiler.flame())
+#
+# For each node it records wall time, queue wait (time since the first task of the same
+# superstep started), LLM calls and input / output tokens, retries and errors. Search
+# provider timings and failures come from the retrieve node as a custom event.
+
+BRANCH_NODE = "conduct_interview"
+
+def _empty() -> dict:
+    return {"calls": 0, "wall": 0.0, "queue_wait": 0.0, "llm_calls": 0, "input_tokens": 0,
+            "output_tokens": 0, "retries": 0, "errors": 0}
+
+class GraphProfiler(BaseCallbackHandler):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = None
+        self.finished = None
+        self._parents: dict[UUID, Optional[UUID]] = {}
+        self._nodes: dict[UUID, dict] = {} # node run id -> record
+        self._attempts: dict[str, int] = defaultdict(int) # task checkpoint ns -> attempts
+        self._step_starts: dict[tuple, float] = {}
+        self._branches: dict[str, str] = {} # branch task id -> analyst name
+        self.records: list[dict] = []
+        self.providers: dict[str, dict] = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "errors": 0, "late": 0})
+
+    ### Callbacks
+
+    def on_chain_start(self, serialized: Optional[dict], inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, tags: Optional[list] = None,
+                       metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        now = time.perf_counter()
+        metadata = metadata or {}
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            if self.started is None:
+                self.started = now
+            # Node runs are tagged with their superstep
+            if not any(tag.startswith("graph:step:") for tag in tags or []):
+                return
+            node = metadata.get("langgraph_node")
+            if not node or node.startswith("__"):
+                return
+            task_ns = metadata.get("langgraph_checkpoint_ns", "")
+            namespace = task_ns.rsplit("|", 1)[0] if "|" in task_ns else ""
+            step_key = (namespace, metadata.get("langgraph_step"))
+            step_start = self._step_starts.setdefault(step_key, now)
+            self._attempts[task_ns] += 1
+            if node == BRANCH_NODE and isinstance(inputs, dict) and inputs.get("analyst") is not None:
+                self._branches[task_ns.split("|")[0]] = getattr(inputs["analyst"], "name", str(inputs["analyst"]))
+            self._nodes[run_id] = {
+                "node": node,
+                "task": task_ns,
+                "branch_task": task_ns.split("|")[0] if task_ns.startswith(BRANCH_NODE) else None,
+                "start": now,
+                "queue_wait": now - step_start,
+                "retry": self._attempts[task_ns] > 1,
+                "llm_calls": 0, "input_tokens": 0, "output_tokens": 0,
+            }
+
+    def _finish(self, run_id: UUID, error: bool):
+        now = time.perf_counter()
+        with self._lock:
+            self.finished = now
+            record = self._nodes.pop(run_id, None)
+            if record is None:
+                return
+            record["wall"] = now - record["start"]
+            record["error"] = error
+            self.records.append(record)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=False)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=True)
+
+    def _node_of(self, run_id: Optional[UUID]) -> Optional[dict]:
+        # Walk up to the closest enclosing node run
+        while run_id is not None:
+            if run_id in self._nodes:
+                return self._nodes[run_id]
+            run_id = self._parents.get(run_id)
+        return None
+
+    def on_llm_start(self, serialized: dict, prompts: list, *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        with self._lock:
+            record = self._node_of(run_id)
+            if record is not None:
+                record["llm_calls"] += 1
+                record["input_tokens"] += input_tokens
+                record["output_tokens"] += output_tokens
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self.providers["llm"]["errors"] += 1
+
+    def on_custom_event(self, name: str, data: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if name != "provider_calls":
+            return
+        with self._lock:
+            for provider, stats in data.items():
+                totals = self.providers[provider]
+                totals["calls"] += 1
+                totals["seconds"] += stats.get("seconds") or 0.0
+                totals["errors"] += bool(stats.get("error"))
+                totals["late"] += bool(stats.get("late"))
+
+    ### Reports
+
+    def _aggregate(self, records: list[dict]) -> dict:
+        totals = defaultdict(_empty)
+        for record in records:
+            row = totals[record["node"]]
+            row["calls"] += 1
+            row["wall"] += record["wall"]
+            row["queue_wait"] += record["queue_wait"]
+            row["llm_calls"] += record["llm_calls"]
+            row["input_tokens"] += record["input_tokens"]
+            row["output_tokens"] += record["output_tokens"]
+            row["retries"] += record["retry"]
+            row["errors"] += record["error"]
+        return {node: {k: round(v, 4) if isinstance(v, float) else v for k, v in row.items()}
+                for node, row in totals.items()}
+
+    def summary(self) -> dict:
+        """ Per-run profile: totals per node of the outer graph, and per node of each analyst branch """
+        with self._lock:
+            records = list(self.records)
+            providers = {name: dict(stats) for name, stats in self.providers.items()}
+            wall = (self.finished or 0) - (self.started or 0)
+        branches = defaultdict(list)
+        for record in records:
+            if record["branch_task"] and record["node"] != BRANCH_NODE:
+                branches[self._branches.get(record["branch_task"], record["branch_task"])].append(record)
+        return {
+            "wall": round(wall, 4),
+            "input_tokens": sum(r["input_tokens"] for r in records),
+            "output_tokens": sum(r["output_tokens"] for r in records),
+            "nodes": self._aggregate([r for r in records if not r["branch_task"] or r["node"] == BRANCH_NODE]),
+            "interview_nodes": self._aggregate([r for r in records if r["branch_task"] and r["node"] != BRANCH_NODE]),
+            "branches": {name: self._aggregate(rows) for name, rows in sorted(branches.items())},
+            "providers": providers,
+        }
+
+    def save(self, path: str) -> dict:
+        summary = self.summary()
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+        return summary
+
+    def flame(self, width: int = 40) -> str:
+        """ Text breakdown of where the time went, one bar per node, branches nested """
+        summary = self.summary()
+        total = summary["wall"] or 1.0
+        lines = [f"run {summary['wall']:.2f}s  tokens in {summary['input_tokens']:,} / out {summary['output_tokens']:,}"]
+
+        def row(label: str, stats: dict, indent: int):
+            # Parallel branches can add up to more than the run itself
+            bar = "█" * min(width, max(1, round(width * stats["wall"] / total)))
+            extra = f"  wait {stats['queue_wait']:.2f}s" if stats["queue_wait"] >= 0.01 else ""
+            if stats["llm_calls"]:
+                extra += f"  llm x{stats['llm_calls']} {stats['input_tokens']:,}/{stats['output_tokens']:,} tok"
+            if stats["retries"] or stats["errors"]:
+                extra += f"  retries {stats['retries']} errors {stats['errors']}"
+            lines.append(f"{'  ' * indent}{label:<{34 - 2 * indent}} {stats['wall']:>8.2f}s {bar}{extra}")
+
+        for node, stats in summary["nodes"].items():
+            row(f"{node} x{stats['calls']}" if stats["calls"] > 1 else node, stats, 1)
+            if node == BRANCH_NODE:
+                for analyst, nodes in summary["branches"].items():
+                    lines.append(f"    [{analyst}]")
+                    for name, branch_stats in nodes.items():
+                        row(f"{name} x{branch_stats['calls']}", branch_stats, 3)
+        for provider, stats in summary["providers"].items():
+            lines.append(f"  provider {provider}: {stats['calls']} calls, {stats['seconds']:.2f}s, "
+                         f"{stats['errors']} errors, {stats['late']} late")
+        return "\n".join(lines)
@@ -0,0 +1,95 @@
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Columnar batch of Log records (see sub_graphs.py) for large log volumes: one NumPy
+# array per field instead of one dict per log, so the failure analysis filters, groups
+# and counts with array operations instead of Python loops over dicts.
+#
+#   batch = LogBatch.from_logs(logs)
+#   failures = batch.failures()              # the logs with a "grade" key, as a LogBatch
+#   failures.failure_stats()                 # counts and mean grade, overall and per grader
+#
+# get_failures and both generate_summary nodes of sub_graphs.py accept a LogBatch in
+# cleaned_logs as well as a list of Log. A LogBatch is not serializable by the
+# checkpointers, it is meant for runs without one, like log_stream.py.
+
+class LogBatch:
+    """ Log records stored by field
+
+    grade is a float array with NaN where a log has no grade, has_grade tells which
+    logs have the key at all (like "grade" in log), grader holds indexes into graders
+    with -1 for logs without one. The fields the analysis does not read (question,
+    docs, feedback) stay in the source records, rows locates each log among them.
+    """
+
+    def __init__(self, ids: np.ndarray, answers: np.ndarray, grade: np.ndarray, has_grade: np.ndarray,
+                 grader: np.ndarray, graders: list[str], records: list[dict], rows: np.ndarray):
+        self.ids = ids
+        self.answers = answers
+        self.grade = grade
+        self.has_grade = has_grade
+        self.grader = grader
+        self.graders = graders
+        self.records = records
+        self.rows = rows
+
+    @classmethod
+    def from_logs(cls, logs: Iterable[dict]) -> "LogBatch":
+        logs = logs if isinstance(logs, list) else list(logs)
+        codes: dict[str, int] = {}
+        grader = np.fromiter((codes.setdefault(log["grader"], len(codes)) if log.get("grader") is not None else -1
+                              for log in logs), dtype=np.int32, count=len(logs))
+        grade = np.fromiter((np.nan if log.get("grade") is None else log["grade"] for log in logs),
+                            dtype=np.float64, count=len(logs))
+        return cls(ids=np.array([str(log["id"]) for log in logs], dtype=str),
+                   answers=np.array([log.get("answer", "") for log in logs], dtype=object),
+                   grade=grade,
+                   has_grade=np.fromiter(("grade" in log for log in logs), dtype=bool, count=len(logs)),
+                   grader=grader,
+                   graders=list(codes),
+                   records=logs,
+                   rows=np.arange(len(logs)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def select(self, mask: np.ndarray) -> "LogBatch":
+        """ The logs where mask is true (or at the given indexes) """
+        index = np.flatnonzero(mask) if mask.dtype == bool else mask
+        return LogBatch(self.ids.take(index), self.answers.take(index), self.grade.take(index),
+                        self.has_grade.take(index), self.grader.take(index), self.graders,
+                        self.records, self.rows.take(index))
+
+    def failures(self) -> "LogBatch":
+        """ Logs that contain a failure, the ones with a grade key """
+        return self.select(self.has_grade)
+
+    def grader_counts(self, mask: Optional[np.ndarray] = None) -> dict[str, int]:
+        """ Number of logs per grader, of the logs where mask is true when given """
+        grader = self.grader if mask is None else self.grader[mask]
+        counts = np.bincount(grader[grader >= 0], minlength=len(self.graders))
+        return {name: int(count) for name, count in zip(self.graders, counts) if count}
+
+    def failure_stats(self) -> dict:
+        """ Failures overall and per grader, with their mean grade """
+        failures = int(self.has_grade.sum())
+        graded = self.has_grade & (self.grader >= 0)
+        scored = graded & ~np.isnan(self.grade)
+        counts = np.bincount(self.grader[graded], minlength=len(self.graders))
+        sums = np.bincount(self.grader[scored], weights=self.grade[scored], minlength=len(self.graders))
+        scores = np.bincount(self.grader[scored], minlength=len(self.graders))
+        known = self.has_grade & ~np.isnan(self.grade)
+        return {
+            "logs": len(self),
+            "failures": failures,
+            "failure_rate": failures / len(self) if len(self) else 0.0,
+            "mean_grade": float(self.grade[known].mean()) if known.any() else None,
+            "by_grader": {name: {"failures": int(counts[code]),
+                                 "mean_grade": float(sums[code] / scores[code]) if scores[code] else None}
+                          for code, name in enumerate(self.graders) if counts[code]},
+        }
+
+    def to_logs(self) -> list[dict]:
+        """ The source Log dicts of the batch """
+        return [self.records[row] for row in self.rows.tolist()]
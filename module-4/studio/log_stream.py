@@ -0,0 +1,95 @@
+"""Stream logs from a JSON lines file through the sub-graph log pipeline in chunks."""
+import argparse
+import bz2
+import gc
+import gzip
+import itertools
+import json
+import lzma
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from processed_logs import merge_processed, processed_count
+
+# Streaming ingestion for sub_graphs.py: instead of one invoke with every log in
+# raw_logs, the file is read chunk_size logs at a time and each chunk goes through the
+# entry graph (clean_logs, then failure_analysis and question_summarization) on its own.
+# At most concurrency chunks are in flight, plus the one being read, so memory is bound
+# by the chunk size whatever the size of the file.
+#
+#   for result in ingest_logs("logs-2024-06-01.jsonl.gz", chunk_size=10000):
+#       print(result["fa_summary"], processed_count(result["processed_logs"]))
+#
+#   python log_stream.py logs-2024-06-01.jsonl.gz --chunk-size 10000 --concurrency 4
+#
+# Files can be plain, .gz, .bz2 or .xz, one Log per line.
+
+def open_logs(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    if path.endswith(".xz"):
+        return lzma.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+def read_log_chunks(path: str, chunk_size: int = 10000) -> Iterator[list[dict]]:
+    """ Logs of the file, chunk_size at a time, blank lines skipped """
+    with open_logs(path) as f:
+        logs = (json.loads(line) for line in f if line.strip())
+        while chunk := list(itertools.islice(logs, chunk_size)):
+            yield chunk
+
+def ingest_logs(path: str, chunk_size: int = 10000, concurrency: int = 1, graph=None,
+                config: Optional[dict] = None, columnar: bool = False) -> Iterator[dict]:
+    """ Output of the entry graph for every chunk of the file, in file order
+
+    columnar sends every chunk as a LogBatch (see log_batch.py) instead of a list of Log.
+    """
+    if graph is None:
+        from sub_graphs import graph
+    chunks = read_log_chunks(path, chunk_size)
+    if columnar:
+        from log_batch import LogBatch
+        chunks = map(LogBatch.from_logs, chunks)
+
+    # A finished run is left in reference cycles inside the Pregel loop (its task configs
+    # refer back to the loop, which holds the channels), and they keep the whole chunk
+    # alive until the collector gets to them, which can be many chunks later. The cycles
+    # are made during the run, so collecting the young generations after every chunk
+    # frees them; a full collection would also walk every long lived object each time.
+    def finished(result: dict) -> dict:
+        gc.collect(1)
+        return result
+
+    if concurrency <= 1:
+        for chunk in chunks:
+            yield finished(graph.invoke({"raw_logs": chunk}, config))
+        return
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="log-stream") as executor:
+        running = deque()
+        for chunk in chunks:
+            running.append(executor.submit(graph.invoke, {"raw_logs": chunk}, config))
+            if len(running) >= concurrency:
+                yield finished(running.popleft().result())
+        while running:
+            yield finished(running.popleft().result())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--columnar", action="store_true", help="Process chunks as LogBatch arrays")
+    args = parser.parse_args()
+
+    chunks, processed = 0, {}
+    for result in ingest_logs(args.path, args.chunk_size, args.concurrency, columnar=args.columnar):
+        chunks += 1
+        processed = merge_processed(processed, result["processed_logs"])
+        print(f"chunk {chunks}: {result['fa_summary']} | {result['report']}")
+    print(f"{chunks} chunks, " + ", ".join(f"{processed_count(processed, kind)} {kind}" for kind in processed))
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,20 @@
-import operator
-from typing import Annotated
+import uuid
+from typing import Annotated, Iterator, Optional
 from typing_extensions import TypedDict
 
 from pydantic import BaseModel
 
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI 
 
 from langgraph.constants import Send
 from langgraph.graph import END, StateGraph, START
 
+import configuration
+from memo import Memo
+from reducers import sorted_merge
+from tournament import Tournament
+
 # Prompts we will use
 subjects_prompt = """Generate a list of 3 sub-topics that are all related to this overall topic: {topic}."""
 joke_prompt = """Generate a joke about {subject}"""
@@ -17,6 +23,12 @@ best_joke_prompt = """Below are a bunch of jokes about {topic}. Select the best
 # LLM
 model = ChatOpenAI(model="gpt-4o", temperature=0) 
 
+# Memoized model calls of the nodes, off unless MAP_REDUCE_MEMO is set (see memo.py)
+memo = Memo.from_env()
+
+def model_settings() -> dict:
+    return {"type": model._llm_type, **model._identifying_params}
+
 # Define the state
 class Subjects(BaseModel):
     subjects: list[str]
@@ -27,42 +39,118 @@ class BestJoke(BaseModel):
 class OverallState(TypedDict):
     topic: str
     subjects: list
-    jokes: Annotated[list, operator.add]
+    jokes: Annotated[list, sorted_merge] # Sorted, so the best_joke prompt (and its memo entry) is the same whatever order the subjects came in
     best_selected_joke: str
+    tournament: str
+
+class Joke(BaseModel):
+    joke: str
+
+@memo("generate_topics", settings=model_settings)
+def write_subjects(prompt: str) -> Subjects:
+    return model.with_structured_output(Subjects).invoke(prompt)
+
+@memo("generate_joke", settings=model_settings)
+def write_joke(prompt: str) -> Joke:
+    return model.with_structured_output(Joke).invoke(prompt)
+
+@memo.batched("generate_joke", settings=model_settings)
+def write_jokes(prompts: list[str], config: RunnableConfig) -> Iterator[tuple[int, Joke]]:
+    return model.with_structured_output(Joke).batch_as_completed(prompts, config)
 
-def generate_topics(state: OverallState):
+@memo("best_joke", settings=model_settings)
+def pick_best_joke(prompt: str, config: Optional[RunnableConfig] = None) -> BestJoke:
+    return model.with_structured_output(BestJoke).invoke(prompt, config)
+
+# Tournaments of the runs in progress, by thread (or by run without one), jokes enter
+# them as soon as they are generated. A run removes its tournament in best_joke, or as
+# soon as a branch fails; best_joke rebuilds a missing one from the jokes in state.
+tournaments: dict[str, Tournament] = {}
+
+def tournament_key(config: RunnableConfig) -> str:
+    return (config or {}).get("configurable", {}).get("thread_id") or uuid.uuid4().hex
+
+def new_tournament(topic: str, bracket_size: int) -> Tournament:
+    def compare(jokes: list, config: Optional[RunnableConfig]) -> int:
+        prompt = best_joke_prompt.format(topic=topic, jokes="\n\n".join(jokes))
+        return pick_best_joke(prompt, config).id
+    return Tournament(compare, bracket_size)
+
+def generate_topics(state: OverallState, config: RunnableConfig):
     prompt = subjects_prompt.format(topic=state["topic"])
-    response = model.with_structured_output(Subjects).invoke(prompt)
-    return {"subjects": response.subjects}
+    response = write_subjects(prompt)
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if not configurable.joke_bracket_size:
+        return {"subjects": response.subjects}
+    # A new run on the thread replaces the tournament of the one before
+    tournament = tournament_key(config)
+    tournaments[tournament] = new_tournament(state["topic"], configurable.joke_bracket_size)
+    return {"subjects": response.subjects, "tournament": tournament}
 
 class JokeState(TypedDict):
     subject: str
+    tournament: str
 
-class Joke(BaseModel):
-    joke: str
-
-def generate_joke(state: JokeState):
+def generate_joke(state: JokeState, config: RunnableConfig):
     prompt = joke_prompt.format(subject=state["subject"])
-    response = model.with_structured_output(Joke).invoke(prompt)
+    try:
+        response = write_joke(prompt)
+        # Plays the brackets this joke completes, within this node's run
+        tournament = tournaments.get(state.get("tournament"))
+        if tournament is not None:
+            tournament.add(response.joke, config)
+    except BaseException:
+        tournaments.pop(state.get("tournament"), None)
+        raise
     return {"jokes": [response.joke]}
 
-def best_joke(state: OverallState):
+def generate_jokes(state: OverallState, config: RunnableConfig):
+    # Batched map: one node and one batch() call for every subject, instead of a branch per subject
+    configurable = configuration.Configuration.from_runnable_config(config)
+    prompts = [joke_prompt.format(subject=subject) for subject in state["subjects"]]
+    tournament = tournaments.get(state.get("tournament"))
+    jokes = [None] * len(prompts)
+    try:
+        # Only the prompts that are not memoized yet are sent to the batch
+        for i, response in write_jokes(prompts, {**config, "max_concurrency": configurable.joke_batch_concurrency}):
+            jokes[i] = response.joke
+            if tournament is not None:
+                tournament.add(response.joke, config)
+    except BaseException:
+        tournaments.pop(state.get("tournament"), None)
+        raise
+    return {"jokes": jokes}
+
+def best_joke(state: OverallState, config: RunnableConfig):
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if configurable.joke_bracket_size:
+        # Play out the tournament the jokes entered, or a new one when it is not in this process (e.g. a resumed run)
+        tournament = tournaments.pop(state.get("tournament"), None)
+        if tournament is None:
+            tournament = new_tournament(state["topic"], configurable.joke_bracket_size)
+            for joke in state["jokes"]:
+                tournament.add(joke, config)
+        return {"best_selected_joke": tournament.result(config)}
     jokes = "\n\n".join(state["jokes"])
     prompt = best_joke_prompt.format(topic=state["topic"], jokes=jokes)
-    response = model.with_structured_output(BestJoke).invoke(prompt)
+    response = pick_best_joke(prompt)
     return {"best_selected_joke": state["jokes"][response.id]}
 
-def continue_to_jokes(state: OverallState):
-    return [Send("generate_joke", {"subject": s}) for s in state["subjects"]]
+def continue_to_jokes(state: OverallState, config: RunnableConfig):
+    if configuration.Configuration.from_runnable_config(config).joke_batch_concurrency:
+        return "generate_jokes"
+    return [Send("generate_joke", {"subject": s, "tournament": state.get("tournament")}) for s in state["subjects"]]
 
 # Construct the graph: here we put everything together to construct our graph
-graph_builder = StateGraph(OverallState)
+graph_builder = StateGraph(OverallState, config_schema=configuration.Configuration)
 graph_builder.add_node("generate_topics", generate_topics)
 graph_builder.add_node("generate_joke", generate_joke)
+graph_builder.add_node("generate_jokes", generate_jokes)
 graph_builder.add_node("best_joke", best_joke)
 graph_builder.add_edge(START, "generate_topics")
-graph_builder.add_conditional_edges("generate_topics", continue_to_jokes, ["generate_joke"])
+graph_builder.add_conditional_edges("generate_topics", continue_to_jokes, ["generate_joke", "generate_jokes"])
 graph_builder.add_edge("generate_joke", "best_joke")
+graph_builder.add_edge("generate_jokes", "best_joke")
 graph_builder.add_edge("best_joke", END)
 
 # Compile the graph
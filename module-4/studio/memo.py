@@ -0,0 +1,191 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import closing
+from typing import Any, Callable, Iterator, Optional
+
+# Memoization of the model call of a node, keyed on the node name, the prompt and the
+# model settings. At temperature 0 the map-step nodes of map_reduce.py are pure functions
+# of their prompt, so a repeated run on the same topic can skip every call it made before.
+#
+#   memo = Memo.from_env()
+#
+#   @memo("generate_joke", settings=model_settings)
+#   def write_joke(prompt: str) -> Joke:
+#       return model.with_structured_output(Joke).invoke(prompt)
+#
+#   @memo.batched("generate_joke", settings=model_settings)    # same entries, many prompts
+#   def write_jokes(prompts: list[str], config) -> Iterator[tuple[int, Joke]]:
+#       return model.with_structured_output(Joke).batch_as_completed(prompts, config)
+#
+# Backends, chosen with MAP_REDUCE_MEMO:
+#   unset or ""      no memoization
+#   "memory"         in-process LRU (MAP_REDUCE_MEMO_SIZE entries, default 4096)
+#   any other value  path of a SQLite file, shared between runs and processes
+#
+# memo.stats() gives hits and misses per node, memo.invalidate() drops entries of one
+# node, one prompt of a node, or everything.
+
+class LRUBackend:
+    """ In-process least recently used cache """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, key: str) -> tuple[bool, Any]:
+        with self._lock:
+            if (name, key) not in self._entries:
+                return False, None
+            self._entries.move_to_end((name, key))
+            return True, self._entries[(name, key)]
+
+    def set(self, name: str, key: str, value: Any):
+        with self._lock:
+            self._entries[(name, key)] = value
+            self._entries.move_to_end((name, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, name: Optional[str] = None, key: Optional[str] = None) -> int:
+        with self._lock:
+            doomed = [k for k in self._entries if (name is None or k[0] == name) and (key is None or k[1] == key)]
+            for k in doomed:
+                del self._entries[k]
+            return len(doomed)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteBackend:
+    """ Cache in a SQLite file, values are pickled """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(sqlite3.connect(path)) as db, db:
+            db.execute("CREATE TABLE IF NOT EXISTS memo (name TEXT, key TEXT, value BLOB, PRIMARY KEY (name, key))")
+
+    def get(self, name: str, key: str) -> tuple[bool, Any]:
+        with self._lock, closing(sqlite3.connect(self.path)) as db:
+            row = db.execute("SELECT value FROM memo WHERE name = ? AND key = ?", (name, key)).fetchone()
+        return (True, pickle.loads(row[0])) if row else (False, None)
+
+    def set(self, name: str, key: str, value: Any):
+        with self._lock, closing(sqlite3.connect(self.path)) as db, db:
+            db.execute("INSERT OR REPLACE INTO memo VALUES (?, ?, ?)", (name, key, pickle.dumps(value)))
+
+    def delete(self, name: Optional[str] = None, key: Optional[str] = None) -> int:
+        query, args = "DELETE FROM memo WHERE 1 = 1", []
+        if name is not None:
+            query, args = query + " AND name = ?", args + [name]
+        if key is not None:
+            query, args = query + " AND key = ?", args + [key]
+        with self._lock, closing(sqlite3.connect(self.path)) as db, db:
+            return db.execute(query, args).rowcount
+
+    def __len__(self) -> int:
+        with self._lock, closing(sqlite3.connect(self.path)) as db:
+            return db.execute("SELECT COUNT(*) FROM memo").fetchone()[0]
+
+def memo_key(prompt: Any, settings: dict) -> str:
+    payload = json.dumps([prompt, settings], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class Memo:
+    """ Decorator factory for memoized node model calls, a no-op without a backend """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._settings: dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Memo":
+        value = os.environ.get("MAP_REDUCE_MEMO", "")
+        if not value:
+            return cls()
+        if value == "memory":
+            return cls(LRUBackend(int(os.environ.get("MAP_REDUCE_MEMO_SIZE", 4096))))
+        return cls(SQLiteBackend(value))
+
+    def __call__(self, name: str, settings: Callable[[], dict] = dict):
+        """ Memoize fn(prompt, ...) under the node name, keyed on the prompt only
+
+        settings() is read on every call, so a swapped or reconfigured model gets new entries.
+        """
+        self._settings[name] = settings
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(prompt, *args, **kwargs):
+                if self.backend is None:
+                    return fn(prompt, *args, **kwargs)
+                key = memo_key(prompt, settings())
+                found, value = self._get(name, key)
+                if found:
+                    return value
+                value = fn(prompt, *args, **kwargs)
+                self.backend.set(name, key, value)
+                return value
+            return wrapper
+        return decorator
+
+    def batched(self, name: str, settings: Callable[[], dict] = dict):
+        """ Memoize fn(prompts, ...), which yields (index, value) pairs as they complete
+
+        Entries are shared with the single prompt functions memoized under the same name.
+        The cached prompts are yielded first, only the others are passed on to fn.
+        """
+        self._settings[name] = settings
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(prompts, *args, **kwargs) -> Iterator[tuple[int, Any]]:
+                if self.backend is None:
+                    yield from fn(prompts, *args, **kwargs)
+                    return
+                current = settings()
+                keys, misses = [memo_key(prompt, current) for prompt in prompts], []
+                for i, key in enumerate(keys):
+                    found, value = self._get(name, key)
+                    if found:
+                        yield i, value
+                    else:
+                        misses.append(i)
+                if not misses:
+                    return
+                for j, value in fn([prompts[i] for i in misses], *args, **kwargs):
+                    self.backend.set(name, keys[misses[j]], value)
+                    yield misses[j], value
+            return wrapper
+        return decorator
+
+    def _get(self, name: str, key: str) -> tuple[bool, Any]:
+        found, value = self.backend.get(name, key)
+        with self._lock:
+            self._stats[name]["hits" if found else "misses"] += 1
+        return found, value
+
+    def invalidate(self, name: Optional[str] = None, prompt: Any = None) -> int:
+        """ Drop the entries of a node (or of all nodes), only the one for prompt when given """
+        if self.backend is None:
+            return 0
+        key = None if prompt is None else memo_key(prompt, self._settings.get(name, dict)())
+        return self.backend.delete(name, key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {name: dict(counts) for name, counts in self._stats.items()}
+        for counts in stats.values():
+            total = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = round(counts["hits"] / total, 3) if total else 0.0
+        return stats
@@ -0,0 +1,284 @@
+"""Local stand-in for Tavily and Wikipedia search, in-process or over HTTP."""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from text_utils import filler_text, tokenize
+
+# Serves a corpus to the search nodes of the parallelization and research graphs without
+# the network, with the latency, rate limits and errors of real providers injected.
+#
+# Point the graphs at it with MOCK_SEARCH, like WIKIPEDIA_SNAPSHOT (which it overrides):
+#   MOCK_SEARCH=local                    in-process service
+#   MOCK_SEARCH=http://127.0.0.1:8765    service started with: python mock_search.py serve --port 8765
+#
+# The in-process service (and the served one, from its command line flags) is set up with:
+#   MOCK_SEARCH_CORPUS          JSON lines of {"provider": "web" | "wikipedia", "title", "url", "content"},
+#                               a synthetic corpus when unset
+#   MOCK_SEARCH_LATENCY         latency of every call: "0.2" | "uniform:0.1:0.3" | "lognormal:0.1:0.5"
+#                               (median seconds and sigma), overridden per provider by
+#                               MOCK_SEARCH_WEB_LATENCY and MOCK_SEARCH_WIKIPEDIA_LATENCY
+#   MOCK_SEARCH_ERROR_RATE      share of calls that fail (0 to 1)
+#   MOCK_SEARCH_RATE_LIMIT      calls per second and provider, more are refused, 0 is unlimited
+#   MOCK_SEARCH_SEED            latencies and errors are drawn from this seed, the query and the
+#                               number of times it was asked, so runs are repeatable
+#
+# Failures raise MockSearchError, refused calls RateLimited, in-process and over HTTP alike.
+
+PROVIDERS = ("web", "wikipedia")
+
+class MockSearchError(RuntimeError):
+    """ Injected provider failure """
+
+class RateLimited(MockSearchError):
+    """ Call refused by the provider's rate limit """
+
+class Latency:
+    """ Latency distribution parsed from "seconds", "uniform:low:high" or "lognormal:median:sigma" """
+
+    # Number of arguments each distribution takes
+    ARGS = {"fixed": (0, 1), "uniform": (2,), "lognormal": (2,)}
+
+    def __init__(self, spec: str = "0"):
+        kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        self.spec, self.kind = spec, kind
+        if kind not in self.ARGS:
+            raise ValueError(f"Unknown latency distribution {spec!r}")
+        self.args = [float(arg) for arg in args.split(":")] if args else []
+        if len(self.args) not in self.ARGS[kind]:
+            raise ValueError(f"Latency {spec!r}: {kind} takes {' or '.join(map(str, self.ARGS[kind]))} arguments")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(*self.args)
+        if self.kind == "lognormal":
+            median, sigma = self.args
+            return median * rng.lognormvariate(0, sigma)
+        return self.args[0] if self.args else 0.0
+
+class TokenBucket:
+    """ Allows rate calls per second on average, with bursts of up to rate calls (at least one) """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        # Below one call per second the bucket still has to hold one whole token
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+def synthetic_corpus(web_pages: int = 40, wikipedia_pages: int = 20) -> list[dict]:
+    """ Pages of filler text, like the ones of fakes.py """
+    pages = []
+    for i in range(web_pages):
+        url = f"https://example.com/articles/{i}"
+        pages.append({"provider": "web", "title": f"Article {i}", "url": url, "content": filler_text(url, 1500)})
+    for i in range(wikipedia_pages):
+        url = f"https://en.wikipedia.org/wiki/Page_{i}"
+        pages.append({"provider": "wikipedia", "title": f"Page {i}", "url": url, "content": filler_text(url, 4000)})
+    return pages
+
+def load_corpus(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class MockSearchService:
+    """ Ranks a corpus per provider by query term overlap, with injected latency, errors and rate limits """
+
+    def __init__(self, corpus: Optional[list[dict]] = None, latency: Optional[dict[str, Latency]] = None,
+                 error_rate: float = 0, rate_limit: float = 0, seed: int = 0):
+        self.latency = {provider: Latency() for provider in PROVIDERS}
+        self.latency.update(latency or {})
+        self.error_rate = error_rate
+        self.buckets = {provider: TokenBucket(rate_limit) for provider in PROVIDERS} if rate_limit > 0 else {}
+        self.seed = seed
+        self.pages = defaultdict(list)
+        for page in corpus if corpus is not None else synthetic_corpus():
+            self.pages[page["provider"]].append((page, Counter(tokenize(f"{page['title']} {page['content']}"))))
+        self.asked = Counter()
+        self.stats = {provider: {"calls": 0, "errors": 0, "rate_limited": 0, "seconds": 0.0} for provider in PROVIDERS}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "MockSearchService":
+        latency = {}
+        for provider in PROVIDERS:
+            spec = os.environ.get(f"MOCK_SEARCH_{provider.upper()}_LATENCY") or os.environ.get("MOCK_SEARCH_LATENCY")
+            if spec:
+                latency[provider] = Latency(spec)
+        corpus = os.environ.get("MOCK_SEARCH_CORPUS")
+        return cls(corpus=load_corpus(corpus) if corpus else None, latency=latency,
+                   error_rate=float(os.environ.get("MOCK_SEARCH_ERROR_RATE", 0)),
+                   rate_limit=float(os.environ.get("MOCK_SEARCH_RATE_LIMIT", 0)),
+                   seed=int(os.environ.get("MOCK_SEARCH_SEED", 0)))
+
+    def rank(self, provider: str, query: str, limit: int) -> list[dict]:
+        """ Best pages for the query, ties (e.g. no shared terms) broken by a hash of query and url """
+        terms = Counter(tokenize(query))
+        def score(entry) -> tuple:
+            page, counts = entry
+            overlap = sum(math.log1p(counts[term]) for term in terms if term in counts)
+            return -overlap, hashlib.sha1(f"{query}:{page['url']}".encode()).hexdigest()
+        return [page for page, _ in sorted(self.pages[provider], key=score)[:limit]]
+
+    def search(self, provider: str, query: str, limit: int) -> list[dict]:
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown provider {provider!r}")
+        with self._lock:
+            self.asked[provider, query] += 1
+            rng = random.Random(f"{self.seed}:{provider}:{query}:{self.asked[provider, query]}")
+            self.stats[provider]["calls"] += 1
+        if provider in self.buckets and not self.buckets[provider].take():
+            with self._lock:
+                self.stats[provider]["rate_limited"] += 1
+            raise RateLimited(f"{provider}: rate limit of {self.buckets[provider].rate}/s exceeded")
+        seconds = self.latency[provider].sample(rng)
+        time.sleep(seconds)
+        with self._lock:
+            self.stats[provider]["seconds"] += seconds
+        if rng.random() < self.error_rate:
+            with self._lock:
+                self.stats[provider]["errors"] += 1
+            raise MockSearchError(f"{provider}: injected failure")
+        return self.rank(provider, query, limit)
+
+class HTTPSearchClient:
+    """ Same search() as MockSearchService, against a served one """
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def search(self, provider: str, query: str, limit: int) -> list[dict]:
+        params = urllib.parse.urlencode({"q": query, "limit": limit})
+        try:
+            with urllib.request.urlopen(f"{self.url}/{provider}?{params}", timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as error:
+            message = error.read().decode("utf-8", "replace")
+            raise (RateLimited if error.code == 429 else MockSearchError)(message) from None
+
+    @property
+    def stats(self) -> dict:
+        with urllib.request.urlopen(f"{self.url}/stats", timeout=self.timeout) as response:
+            return json.load(response)
+
+def serve(service: MockSearchService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """ Serve GET /web?q=&limit=, /wikipedia?q=&limit= and /stats in a background thread """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            params = urllib.parse.parse_qs(url.query)
+            provider = url.path.strip("/")
+            try:
+                if provider == "stats":
+                    status, body = 200, service.stats
+                else:
+                    status, body = 200, service.search(provider, params.get("q", [""])[0],
+                                                       int(params.get("limit", [3])[0]))
+            except RateLimited as error:
+                status, body = 429, str(error)
+            except MockSearchError as error:
+                status, body = 500, str(error)
+            except ValueError as error:
+                status, body = 404, str(error)
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="mock-search").start()
+    return server
+
+@lru_cache(maxsize=None)
+def search_service(target: str):
+    """ The in-process service for "local", a client for an http:// URL """
+    if target.startswith("http://") or target.startswith("https://"):
+        return HTTPSearchClient(target)
+    return MockSearchService.from_env()
+
+class MockTavilySearch:
+    """ Drop-in for TavilySearchResults(max_results=...).invoke(query) served by the mock service """
+
+    def __init__(self, max_results: int = 3, service=None, **kwargs):
+        self.max_results = max_results
+        self.service = service or search_service(os.environ["MOCK_SEARCH"])
+
+    def invoke(self, query: str) -> list[dict]:
+        return [{"url": page["url"], "title": page["title"], "content": page["content"]}
+                for page in self.service.search("web", query, self.max_results)]
+
+class MockWikipediaLoader:
+    """ Drop-in for WikipediaLoader(query=..., load_max_docs=...).load() served by the mock service """
+
+    def __init__(self, query: str, load_max_docs: int = 2, doc_content_chars_max: int = 4000, service=None, **kwargs):
+        self.query = query
+        self.load_max_docs = load_max_docs
+        self.doc_content_chars_max = doc_content_chars_max
+        self.service = service or search_service(os.environ["MOCK_SEARCH"])
+
+    def load(self) -> list[Document]:
+        return [Document(page_content=page["content"][:self.doc_content_chars_max],
+                         metadata={"title": page["title"], "source": page["url"]})
+                for page in self.service.search("wikipedia", self.query, self.load_max_docs)]
+
+def search_backends(live_search, live_loader) -> tuple:
+    """ The mock search classes when MOCK_SEARCH is set, otherwise the ones given """
+    if os.environ.get("MOCK_SEARCH"):
+        return MockTavilySearch, MockWikipediaLoader
+    return live_search, live_loader
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["serve", "query"])
+    parser.add_argument("query", nargs="*", help="query: the search terms")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--provider", default="web", choices=PROVIDERS, help="query: provider to ask")
+    args = parser.parse_args()
+
+    # The MOCK_SEARCH_* variables configure the service in both commands
+    service = MockSearchService.from_env()
+    if args.command == "serve":
+        server = serve(service, args.host, args.port)
+        print(f"Serving mock search on http://{args.host}:{args.port}, MOCK_SEARCH=http://{args.host}:{args.port}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        for page in service.search(args.provider, " ".join(args.query), 3):
+            print(page["url"], page["title"])
+            print(page["content"][:300], "\n")
@@ -4,6 +4,7 @@ from typing_extensions import TypedDict
 
 from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 from langchain_community.document_loaders import WikipediaLoader
 from langchain_community.tools import TavilySearchResults
@@ -12,20 +13,33 @@ from langchain_openai import ChatOpenAI
 
 from langgraph.graph import StateGraph, START, END
 
+import configuration
+from mock_search import search_backends
+from retrieval import collect, discard, hedged_search
+from wiki_snapshot import wikipedia_backend
+
 llm = ChatOpenAI(model="gpt-4o", temperature=0) 
 
+# Serve Wikipedia from a local snapshot instead of the API when WIKIPEDIA_SNAPSHOT is set
+WikipediaLoader = wikipedia_backend(WikipediaLoader)
+
+# Serve both searches from the local mock service when MOCK_SEARCH is set (see mock_search.py)
+TavilySearchResults, WikipediaLoader = search_backends(TavilySearchResults, WikipediaLoader)
+
 class State(TypedDict):
     question: str
     answer: str
     context: Annotated[list, operator.add]
+    stragglers: Annotated[list, operator.add] # Searches that missed the deadline: provider, error, parked search
+    late_context: list # What the stragglers returned after the answer: provider, context or error
 
-def search_web(state):
+def web_context(question: str) -> str:
     
-    """ Retrieve docs from web search """
+    """ Retrieve and format docs from web search """
 
     # Search
     tavily_search = TavilySearchResults(max_results=3)
-    search_docs = tavily_search.invoke(state['question'])
+    search_docs = tavily_search.invoke(question)
 
      # Format
     formatted_search_docs = "\n\n---\n\n".join(
@@ -35,14 +49,14 @@ def search_web(state):
         ]
     )
 
-    return {"context": [formatted_search_docs]} 
+    return formatted_search_docs
 
-def search_wikipedia(state):
+def wikipedia_context(question: str) -> str:
     
-    """ Retrieve docs from wikipedia """
+    """ Retrieve and format docs from wikipedia """
 
     # Search
-    search_docs = WikipediaLoader(query=state['question'], 
+    search_docs = WikipediaLoader(query=question, 
                                   load_max_docs=2).load()
 
      # Format
@@ -53,7 +67,36 @@ def search_wikipedia(state):
         ]
     )
 
-    return {"context": [formatted_search_docs]} 
+    return formatted_search_docs
+
+def search_by_deadline(name: str, search, config: RunnableConfig) -> dict:
+
+    """ Run search, or give up on it for this answer once retrieval_deadline has passed """
+
+    deadline = configuration.Configuration.from_runnable_config(config).retrieval_deadline
+    if deadline <= 0:
+        return {"context": [search()]}
+    try:
+        results, running, stats = hedged_search({name: search}, deadline=deadline)
+    except Exception as error:
+        return {"stragglers": [{"provider": name, "error": repr(error), "search": None}]}
+
+    # The search keeps running on its own thread, collect_stragglers picks up its result
+    if name not in results:
+        return {"stragglers": [{"provider": name, "error": None, "search": running[0]}]}
+    return {"context": [results[name]]}
+
+def search_web(state, config: RunnableConfig):
+    
+    """ Retrieve docs from web search """
+
+    return search_by_deadline("search_web", lambda: web_context(state['question']), config)
+
+def search_wikipedia(state, config: RunnableConfig):
+    
+    """ Retrieve docs from wikipedia """
+
+    return search_by_deadline("search_wikipedia", lambda: wikipedia_context(state['question']), config)
 
 def generate_answer(state):
     
@@ -74,18 +117,42 @@ def generate_answer(state):
     # Append it to state
     return {"answer": answer}
 
+def collect_stragglers(state, config: RunnableConfig):
+
+    """ Record what the searches that missed the deadline returned, once the answer is out """
+
+    # With straggler_timeout 0 (the default) only searches that have finished by now are
+    # recorded, so the run ends at the answer rather than with the slowest provider
+
+    searches = [straggler["search"] for straggler in state.get("stragglers", []) if straggler["search"]]
+    if not searches:
+        return {"late_context": []}
+    results, running = collect(searches, timeout=configuration.Configuration.from_runnable_config(config).straggler_timeout)
+    discard(running)
+    late_context = []
+    for straggler in state["stragglers"]:
+        name = straggler["provider"]
+        if name in results:
+            late_context.append({"provider": name, "context": results[name][0], "error": None})
+        elif straggler["search"]:
+            error = "timed out" if straggler["search"] in running else "failed"
+            late_context.append({"provider": name, "context": None, "error": error})
+    return {"late_context": late_context}
+
 # Add nodes
-builder = StateGraph(State)
+builder = StateGraph(State, config_schema=configuration.Configuration)
 
 # Initialize each node with node_secret 
 builder.add_node("search_web",search_web)
 builder.add_node("search_wikipedia", search_wikipedia)
 builder.add_node("generate_answer", generate_answer)
+builder.add_node("collect_stragglers", collect_stragglers)
 
 # Flow
 builder.add_edge(START, "search_wikipedia")
 builder.add_edge(START, "search_web")
 builder.add_edge("search_wikipedia", "generate_answer")
 builder.add_edge("search_web", "generate_answer")
-builder.add_edge("generate_answer", END)
+builder.add_edge("generate_answer", "collect_stragglers")
+builder.add_edge("collect_stragglers", END)
 graph = builder.compile()
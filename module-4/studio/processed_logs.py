@@ -0,0 +1,129 @@
+import bisect
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+# Compact processed_logs channel for sub_graphs.py. Instead of one string per log and
+# subgraph ("failure-analysis-on-log-7", "summary-on-log-7", ...), the channel holds, per
+# subgraph, a bitmap of the processed log IDs, split like a Roaring bitmap: IDs are
+# grouped by their high bits (id >> 16) and every group is stored as the sorted low 16
+# bits (2 bytes per ID) while it has fewer than 4096 IDs, as a 8KB bitmap once it has
+# more. Log IDs that are not canonical non-negative integers ("a1", "007", or too long
+# for int64) are kept as they are:
+#
+#   {"failure-analysis": {"containers": [[0, b"..."], [3, b"..."]], "ids": ["a1"]},
+#    "summary": {"containers": [[0, b"..."]], "ids": []}}
+#
+# The value is plain lists, dicts and bytes, so the checkpointers store it as is. Merging
+# two values is a union per group, done by NumPy, and a million logs take at most
+# 8KB per 65536 IDs and subgraph.
+#
+#   processed_logs: Annotated[dict, merge_processed]
+#   update = {"processed_logs": processed_update("summary", ids)}
+#   is_processed(state["processed_logs"], "summary", "7"), processed_count(state["processed_logs"])
+#   list(render_processed(state["processed_logs"]))    # the strings, only when needed
+
+# A group with this many IDs or more is a bitmap, below it a sorted array takes less room
+ARRAY_MAX = 4096
+BITMAP_BYTES = 1 << 13
+
+def _canonical(log_id: str) -> bool:
+    """ An ASCII decimal integer that renders back to the same string and fits int64 """
+    # isdecimal() alone also accepts other scripts' digits ("١٢"), which int() would
+    # turn into the same number as "12"
+    return log_id.isascii() and log_id.isdigit() and len(log_id) <= 18 and (log_id[0] != "0" or log_id == "0")
+
+def _container(lows: np.ndarray) -> bytes:
+    """ Sorted, unique low bits of one group, stored the smaller way """
+    if len(lows) < ARRAY_MAX:
+        return lows.astype("<u2").tobytes()
+    bits = np.zeros(1 << 16, dtype=bool)
+    bits[lows] = True
+    return np.packbits(bits, bitorder="little").tobytes()
+
+def _lows(container: bytes) -> np.ndarray:
+    """ Sorted low bits stored in a container """
+    if len(container) == BITMAP_BYTES:
+        return np.flatnonzero(np.unpackbits(np.frombuffer(container, dtype=np.uint8), bitorder="little"))
+    return np.frombuffer(container, dtype="<u2").astype(np.int64)
+
+def _union(left: bytes, right: bytes) -> bytes:
+    if len(left) == BITMAP_BYTES and len(right) == BITMAP_BYTES:
+        return (np.frombuffer(left, dtype=np.uint8) | np.frombuffer(right, dtype=np.uint8)).tobytes()
+    return _container(np.union1d(_lows(left), _lows(right)))
+
+def _containers(numbers: np.ndarray) -> list[list]:
+    if not len(numbers):
+        return []
+    # Logs usually come in ID order, sorting is only needed when they do not
+    if not (numbers[1:] > numbers[:-1]).all():
+        numbers = np.unique(numbers)
+    highs, starts = np.unique(numbers >> 16, return_index=True)
+    stops = np.append(starts[1:], len(numbers))
+    return [[int(high), _container(numbers[start:stop] & 0xFFFF)]
+            for high, start, stop in zip(highs, starts, stops)]
+
+def processed_update(kind: str, ids: Iterable) -> dict:
+    """ Channel update marking the logs with these IDs as processed by kind """
+    ids = [str(log_id) for log_id in (ids.tolist() if isinstance(ids, np.ndarray) else ids)]
+    numbers = [int(log_id) for log_id in ids if _canonical(log_id)]
+    others = {log_id for log_id in ids if not _canonical(log_id)} if len(numbers) < len(ids) else set()
+    return {kind: {"containers": _containers(np.array(numbers, dtype=np.int64)), "ids": sorted(others)}}
+
+def _merge_containers(left: list, right: list) -> list:
+    merged = dict((high, container) for high, container in left)
+    for high, container in right:
+        merged[high] = _union(merged[high], container) if high in merged else container
+    return [[high, merged[high]] for high in sorted(merged)]
+
+def merge_processed(left: Optional[dict], right: Optional[dict]) -> dict:
+    """ Reducer: union of the processed logs of every kind """
+    merged = dict(left or {})
+    for kind, update in (right or {}).items():
+        if kind not in merged:
+            merged[kind] = update
+            continue
+        merged[kind] = {"containers": _merge_containers(merged[kind]["containers"], update["containers"]),
+                        "ids": sorted(set(merged[kind]["ids"]).union(update["ids"]))}
+    return merged
+
+def is_processed(processed: dict, kind: str, log_id) -> bool:
+    entry = processed.get(kind)
+    if entry is None:
+        return False
+    log_id = str(log_id)
+    if not _canonical(log_id):
+        i = bisect.bisect_left(entry["ids"], log_id)
+        return i < len(entry["ids"]) and entry["ids"][i] == log_id
+    number = int(log_id)
+    high, low = number >> 16, number & 0xFFFF
+    containers = entry["containers"]
+    i = bisect.bisect_left(containers, high, key=lambda item: item[0])
+    if i == len(containers) or containers[i][0] != high:
+        return False
+    container = containers[i][1]
+    if len(container) == BITMAP_BYTES:
+        return bool(container[low >> 3] >> (low & 7) & 1)
+    lows = np.frombuffer(container, dtype="<u2")
+    j = int(np.searchsorted(lows, low))
+    return j < len(lows) and lows[j] == low
+
+def _size(container: bytes) -> int:
+    if len(container) == BITMAP_BYTES:
+        return int(np.unpackbits(np.frombuffer(container, dtype=np.uint8)).sum())
+    return len(container) // 2
+
+def processed_count(processed: dict, kind: Optional[str] = None) -> int:
+    """ Processed logs of one kind, or of every kind together """
+    kinds = [kind] if kind is not None else list(processed)
+    return sum(sum(_size(container) for _, container in processed[k]["containers"]) + len(processed[k]["ids"])
+               for k in kinds if k in processed)
+
+def render_processed(processed: dict) -> Iterator[str]:
+    """ The entries as the subgraphs used to write them, e.g. "summary-on-log-7" """
+    for kind, entry in processed.items():
+        for high, container in entry["containers"]:
+            for number in (_lows(container) + (high << 16)).tolist():
+                yield f"{kind}-on-log-{number}"
+        for log_id in entry["ids"]:
+            yield f"{kind}-on-log-{log_id}"
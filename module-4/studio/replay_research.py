@@ -0,0 +1,67 @@
+"""Record a research_assistant run into a cassette, or replay it offline."""
+import argparse
+import os
+import statistics
+import time
+
+# Record a full research_assistant run, or replay it offline to
+# profile the graph orchestration (conduct_interview fan-out etc.) between commits.
+#
+#   python replay_research.py record runs/llm.cassette.json.gz --topic "LangGraph" --max-analysts 3
+#   python replay_research.py replay runs/llm.cassette.json.gz --repeat 10 --latency 0.05
+#   python replay_research.py replay runs/llm.cassette.json.gz --profile runs/profile.json
+
+def run_once(graph, topic: str, max_analysts: int, thread_id: str, callbacks: list = None) -> dict:
+    """ Run the graph end to end, approving the generated analysts """
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": callbacks or []}
+    graph.invoke({"topic": topic, "max_analysts": max_analysts}, config)
+    graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+    return graph.invoke(None, config)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("cassette")
+    parser.add_argument("--topic", default="The benefits of adopting LangGraph as an agent framework")
+    parser.add_argument("--max-analysts", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5, help="Number of replays to time")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every replayed call")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="Multiplier on recorded call durations")
+    parser.add_argument("--profile", help="Write a per node profile of the last run to this JSON file")
+    args = parser.parse_args()
+
+    # The graph module reads the cassette settings at import time
+    os.environ["RESEARCH_CASSETTE"] = args.cassette
+    os.environ["RESEARCH_CASSETTE_MODE"] = args.mode
+    os.environ["RESEARCH_CASSETTE_LATENCY"] = str(args.latency)
+    os.environ["RESEARCH_CASSETTE_LATENCY_SCALE"] = str(args.latency_scale)
+
+    from langgraph.checkpoint.memory import MemorySaver
+    import research_assistant
+    from instrumentation import GraphProfiler
+
+    cassette = research_assistant.cassette
+    graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+
+    # The run inputs are stored in the cassette so a replay asks exactly the same questions
+    inputs = cassette.play("inputs", "run", lambda: {"topic": args.topic, "max_analysts": args.max_analysts})
+
+    timings = []
+    for i in range(1 if args.mode == "record" else args.repeat):
+        cassette.rewind()
+        profiler = GraphProfiler()
+        start = time.perf_counter()
+        result = run_once(graph, inputs["topic"], inputs["max_analysts"], thread_id=str(i),
+                          callbacks=[profiler] if args.profile else None)
+        timings.append(time.perf_counter() - start)
+
+    cassette.save()
+    print(f"{args.mode}: {cassette.stats()}")
+    print(f"sections: {len(result['sections'])}, report: {len(result['final_report'])} chars")
+    if args.profile:
+        profiler.save(args.profile)
+        print(profiler.flame())
+    print(f"wall time: median {statistics.median(timings):.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s over {len(timings)} run(s)")
+
+if __name__ == "__main__":
+    main()
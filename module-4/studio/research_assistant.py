@@ -1,19 +1,67 @@
+import hashlib
 import operator
+from collections import Counter
+from dataclasses import asdict
 from pydantic import BaseModel, Field
 from typing import Annotated, List
 from typing_extensions import TypedDict
 
 from langchain_community.document_loaders import WikipediaLoader
 from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, get_buffer_string
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, get_buffer_string
+from langchain_core.callbacks.manager import dispatch_custom_event
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 
 from langgraph.constants import Send
 from langgraph.graph import END, MessagesState, START, StateGraph
+from langgraph.types import RetryPolicy
+
+import configuration
+from batching import MicroBatcher
+from blobstore import BlobStore
+from budget import EXHAUSTED, LOW, OK, budget_level, budgeted
+from cassette import Cassette
+from citations import build_bibliography, document_source, merge_sources, web_source
+from documents import SourceDocument, format_documents, provider_scores
+from mock_search import search_backends
+from retrieval import collect, discard, hedged_search
+from reuse_index import ReuseIndex
+from scheduler import InterviewScheduler
+from speculation import Speculator
+from wiki_snapshot import wikipedia_backend
 
 ### LLM
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0) 
+# Optional record / replay of all LLM calls and searches, configured from the environment (see cassette.py)
+cassette = Cassette.from_env()
+
+# Optional micro-batching of the model calls of concurrent nodes, configured from the environment (see batching.py)
+batcher = MicroBatcher.from_env()
+
+llm = batcher.chat_model(cassette.chat_model(lambda: ChatOpenAI(model="gpt-4o", temperature=0)))
+
+### Search
+
+# Serve Wikipedia from a local snapshot instead of the API when WIKIPEDIA_SNAPSHOT is set
+WikipediaLoader = wikipedia_backend(WikipediaLoader)
+
+# Serve both searches from the local mock service when MOCK_SEARCH is set (see mock_search.py)
+TavilySearchResults, WikipediaLoader = search_backends(TavilySearchResults, WikipediaLoader)
+
+### Documents
+
+# With RESEARCH_BLOB_DIR set, retrieved text is stored once on disk and the SourceDocument
+# records in state (and so in every checkpoint) only hold references to it
+blobs = BlobStore.from_env()
+
+# Analysts and interviews of past runs, reused for similar topics (see reuse_index.py)
+reuse_index = ReuseIndex.from_env()
+
+def format_context(documents: list, config: RunnableConfig, current: int = 0) -> str:
+    """ Render the documents of an interview into the context block of a prompt, the last current ones first """
+    configurable = configuration.Configuration.from_runnable_config(config)
+    return format_documents(documents, blobs.get, max_chars=configurable.context_max_chars, current=current)
 
 ### Schema 
 
@@ -33,24 +81,58 @@ class Analyst(BaseModel):
     @property
     def persona(self) -> str:
         return f"Name: {self.name}\nRole: {self.role}\nAffiliation: {self.affiliation}\nDescription: {self.description}\n"
+    @property
+    def key(self) -> str:
+        # Same persona, same key: an interview is reused for as long as the analyst is unchanged
+        return "A" + hashlib.sha1(self.persona.encode("utf-8")).hexdigest()[:10]
 
 class Perspectives(BaseModel):
     analysts: List[Analyst] = Field(
         description="Comprehensive list of analysts with their roles and affiliations.",
     )
 
+def merge_interviews(left: dict | None, right: dict | None) -> dict:
+    """ operator.or_ for interviews, an analyst key set to None is removed """
+    merged = {**(left or {}), **(right or {})}
+    return {key: sections for key, sections in merged.items() if sections is not None}
+
+def merge_sections(left: list | None, right) -> list:
+    """ operator.add for sections, {"remove": [...]} drops those sections (one copy each) """
+    if isinstance(right, dict):
+        doomed = Counter(right["remove"])
+        kept = []
+        for section in left or []:
+            if doomed[section]:
+                doomed[section] -= 1
+            else:
+                kept.append(section)
+        return kept
+    return (left or []) + right
+
 class GenerateAnalystsState(TypedDict):
     topic: str # Research topic
     max_analysts: int # Number of analysts
     human_analyst_feedback: str # Human feedback
+    analyst_feedback: dict # Analyst name -> feedback, only these analysts are regenerated
     analysts: List[Analyst] # Analyst asking questions
+    max_num_turns: int # Number turns of conversation in each interview
+    interviews: Annotated[dict, merge_interviews] # Analyst key -> sections, reused while the analyst is unchanged
 
 class InterviewState(MessagesState):
+    topic: str # Research topic
     max_num_turns: int # Number turns of conversation
-    context: Annotated[list, operator.add] # Source docs
+    context: Annotated[list, operator.add] # Source docs, as SourceDocument records
+    turn_documents: Annotated[list, operator.add] # Number of source docs retrieved in each turn
+    context_start: int # Source docs before this one are covered by the digest
+    digest: str # Running digest of the compressed turns
+    compressed_turns: int # Expert answers covered by the digest
+    transcript: Annotated[list, operator.add] # Blob references of the compressed turns, for the full transcript
+    sources: Annotated[dict, merge_sources] # Source ID -> link, registered at retrieval
+    pending_searches: list # Searches that missed the retrieval deadline, collected next turn
     analyst: Analyst # Analyst asking questions
     interview: str # Interview transcript
     sections: list # Final key we duplicate in outer state for Send() API
+    priority: int # Scheduling priority of the interview, lower starts first
 
 class SearchQuery(BaseModel):
     search_query: str = Field(None, description="Search query for retrieval.")
@@ -59,8 +141,13 @@ class ResearchGraphState(TypedDict):
     topic: str # Research topic
     max_analysts: int # Number of analysts
     human_analyst_feedback: str # Human feedback
+    analyst_feedback: dict # Analyst name -> feedback, only these analysts are regenerated
     analysts: List[Analyst] # Analyst asking questions
-    sections: Annotated[list, operator.add] # Send() API key
+    max_num_turns: int # Number turns of conversation in each interview
+    approved_analysts: List[str] # Names of analysts the human approved, interviewed first
+    sections: Annotated[list, merge_sections] # Send() API key
+    interviews: Annotated[dict, merge_interviews] # Analyst key -> sections, reused while the analyst is unchanged
+    sources: Annotated[dict, merge_sources] # Source ID -> link, used for the bibliography
     introduction: str # Introduction for the final report
     content: str # Content for the final report
     conclusion: str # Conclusion for the final report
@@ -83,13 +170,79 @@ analyst_instructions="""You are tasked with creating a set of AI analyst persona
 
 5. Assign one analyst to each theme."""
 
-def create_analysts(state: GenerateAnalystsState):
+analyst_revision_instructions="""You are tasked with revising a set of AI analyst personas for this research topic:
+{topic}
+
+These analysts are kept as they are, do not duplicate their themes:
+
+{kept}
+
+Replace each of the following analysts, taking the editorial feedback on it into account:
+
+{revised}
+
+Create exactly {count} analysts, one replacement for each analyst above, in the same order."""
+
+def revise_analysts(state: GenerateAnalystsState, config: RunnableConfig):
+
+    """ Regenerate only the analysts the feedback is about """
+
+    analysts = state["analysts"]
+    feedback = {name.strip().lower(): text for name, text in state["analyst_feedback"].items()}
+    targets = [i for i, analyst in enumerate(analysts) if analyst.name.strip().lower() in feedback]
+    if not targets:
+        return {"analyst_feedback": {}}
+
+    kept = "\n".join(analyst.persona for i, analyst in enumerate(analysts) if i not in targets)
+    revised = "\n".join(f"{analysts[i].persona}Feedback: {feedback[analysts[i].name.strip().lower()]}\n" for i in targets)
+    system_message = analyst_revision_instructions.format(topic=state["topic"], kept=kept or "None",
+                                                          revised=revised, count=len(targets))
+    structured_llm = llm.with_structured_output(Perspectives)
+    messages = [SystemMessage(content=system_message)]+[HumanMessage(content="Generate the replacement analysts.")]
+    replacements = structured_llm.invoke(messages).analysts
+    if len(replacements) < len(targets):
+        # Ask once more, otherwise feedback on the missing analysts would be dropped silently
+        messages.append(HumanMessage(content=f"You returned {len(replacements)} analysts, exactly {len(targets)} are needed."))
+        replacements = structured_llm.invoke(messages).analysts
+    if len(replacements) < len(targets):
+        raise ValueError(f"Expected {len(targets)} replacement analysts, the model returned {len(replacements)}")
+
+    # Replacements take the place of the analysts they revise, the others keep their interviews
+    analysts = list(analysts)
+    for i, analyst in zip(targets, replacements):
+        analysts[i] = analyst
+    speculate_interviews(state, analysts, config)
+    return {"analysts": analysts, "analyst_feedback": {}, **drop_interviews(state, analysts)}
+
+def drop_interviews(state: GenerateAnalystsState, analysts: list) -> dict:
+    """ Update removing the interviews, and their sections, of analysts that were replaced """
+    interviews = state.get("interviews") or {}
+    replaced = set(interviews) - {analyst.key for analyst in analysts}
+    if not replaced:
+        return {}
+    return {"interviews": {key: None for key in replaced},
+            "sections": {"remove": [section for key in replaced for section in interviews[key]]}}
+
+def create_analysts(state: GenerateAnalystsState, config: RunnableConfig):
     
     """ Create analysts """
+
+    # Feedback on specific analysts only regenerates those
+    if state.get("analyst_feedback") and state.get("analysts"):
+        return revise_analysts(state, config)
     
     topic=state['topic']
     max_analysts=state['max_analysts']
     human_analyst_feedback=state.get('human_analyst_feedback', '')
+
+    # Analysts of a similar past topic, unless the human asked for different ones
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if configurable.reuse_min_similarity and not human_analyst_feedback:
+        past = reuse_index.similar_analysts(topic, configurable.reuse_min_similarity, max_analysts)
+        if past:
+            analysts = [Analyst(**analyst) for analyst in past[1]]
+            speculate_interviews(state, analysts, config)
+            return {"analysts": analysts, **drop_interviews(state, analysts)}
         
     # Enforce structured output
     structured_llm = llm.with_structured_output(Perspectives)
@@ -101,12 +254,17 @@ def create_analysts(state: GenerateAnalystsState):
 
     # Generate question 
     analysts = structured_llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content="Generate the set of analysts.")])
+
+    # Interview them in the background while the human reviews them
+    speculate_interviews(state, analysts.analysts, config)
+    reuse_index.add_analysts(topic, [analyst.model_dump() for analyst in analysts.analysts])
     
     # Write the list of analysis to state
-    return {"analysts": analysts.analysts}
+    return {"analysts": analysts.analysts, **drop_interviews(state, analysts.analysts)}
 
-def human_feedback(state: GenerateAnalystsState):
+def human_feedback(state: ResearchGraphState):
     """ No-op node that should be interrupted on """
+    # Typed with the full state, like discard_speculation that follows it and reads every key the review can update
     pass
 
 # Generate analyst question
@@ -137,7 +295,7 @@ def generate_question(state: InterviewState):
     messages = state["messages"]
 
     # Generate question 
-    system_message = question_instructions.format(goals=analyst.persona)
+    system_message = question_instructions.format(goals=analyst.persona) + digest_section(state)
     question = llm.invoke([SystemMessage(content=system_message)]+messages)
         
     # Write messages to state
@@ -154,51 +312,83 @@ Pay particular attention to the final question posed by the analyst.
 
 Convert this final question into a well-structured web search query""")
 
-def search_web(state: InterviewState):
+def search_web(query: str):
     
     """ Retrieve docs from web search """
 
     # Search
-    tavily_search = TavilySearchResults(max_results=3)
+    search_docs = cassette.search("tavily", query,
+                                  lambda: TavilySearchResults(max_results=3).invoke(query))
 
-    # Search query
-    structured_llm = llm.with_structured_output(SearchQuery)
-    search_query = structured_llm.invoke([search_instructions]+state['messages'])
-    
-    # Search
-    search_docs = tavily_search.invoke(search_query.search_query)
-
-     # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
-            for doc in search_docs
-        ]
-    )
+    # Register sources
+    registered = [web_source(doc) for doc in search_docs]
+
+    # Store
+    documents = [
+        SourceDocument(id=sid, source=link, page="", blob=blobs.put(doc["content"]), score=score)
+        for (sid, link), doc, score in zip(registered, search_docs, provider_scores(search_docs))
+    ]
 
-    return {"context": [formatted_search_docs]} 
+    return documents, dict(registered)
 
-def search_wikipedia(state: InterviewState):
+def search_wikipedia(query: str):
     
     """ Retrieve docs from wikipedia """
 
+    # Search
+    search_docs = cassette.search("wikipedia", query,
+                                  lambda: WikipediaLoader(query=query, 
+                                                          load_max_docs=2).load())
+
+    # Register sources
+    registered = [document_source(doc.metadata) for doc in search_docs]
+
+    # Store
+    documents = [
+        SourceDocument(id=sid, source=doc.metadata["source"], page=str(doc.metadata.get("page", "")),
+                       blob=blobs.put(doc.page_content), score=score)
+        for (sid, _), doc, score in zip(registered, search_docs, provider_scores([doc.metadata for doc in search_docs]))
+    ]
+
+    return documents, dict(registered)
+
+def retrieve(state: InterviewState, config: RunnableConfig):
+
+    """ Plan one search query and run it against all providers concurrently """
+
+    configurable = configuration.Configuration.from_runnable_config(config)
+
+    # Pick up searches that missed the previous turn's deadline
+    late_results, pending = collect(state.get("pending_searches", []))
+
     # Search query
     structured_llm = llm.with_structured_output(SearchQuery)
     search_query = structured_llm.invoke([search_instructions]+state['messages'])
-    
-    # Search
-    search_docs = WikipediaLoader(query=search_query.search_query, 
-                                  load_max_docs=2).load()
-
-     # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-            for doc in search_docs
-        ]
-    )
+    query = search_query.search_query
+
+    # Wikipedia is secondary retrieval, skipped once the run budget is running low
+    searches = {"web": lambda: search_web(query)}
+    if budget_level(config) == OK:
+        searches["wikipedia"] = lambda: search_wikipedia(query)
+
+    # Proceed with what has arrived by the deadline, stragglers are attached to the next turn
+    results, running, stats = hedged_search(searches,
+                                            min_results=configurable.retrieval_min_results,
+                                            deadline=configurable.retrieval_deadline)
+
+    # Provider timings and failures, picked up by the profiler (see instrumentation.py)
+    dispatch_custom_event("provider_calls", stats, config=config)
+
+    # Provider order rather than arrival order, so prompts are the same from run to run
+    arrived = [results[name] for name in searches if name in results]
+    arrived += [result for name in sorted(late_results) for result in late_results[name]]
 
-    return {"context": [formatted_search_docs]} 
+    context, sources = [], {}
+    for documents, found in arrived:
+        context += documents
+        sources.update(found)
+
+    return {"context": context, "turn_documents": [len(context)], "sources": sources, "pending_searches": pending + running}
 
 # Generate expert answer
 answer_instructions = """You are an expert being interviewed by an analyst.
@@ -217,29 +407,26 @@ When answering questions, follow these guidelines:
         
 2. Do not introduce external information or make assumptions beyond what is explicitly stated in the context.
 
-3. The context contain sources at the topic of each individual document.
+3. The context contain sources at the topic of each individual document, for example: <Document id="S1a2b3c"/>
 
-4. Include these sources your answer next to any relevant statements. For example, for source # 1 use [1]. 
+4. Cite these sources in your answer next to any relevant statements, using the ID in brackets. For example, for <Document id="S1a2b3c"/> use [S1a2b3c]. 
 
-5. List your sources in order at the bottom of your answer. [1] Source 1, [2] Source 2, etc
-        
-6. If the source is: <Document source="assistant/docs/llama3_1.pdf" page="7"/>' then just list: 
-        
-[1] assistant/docs/llama3_1.pdf, page 7 
-        
-And skip the addition of the brackets as well as the Document source preamble in your citation."""
+5. Use the IDs exactly as given. Do not renumber the sources and do not list them at the bottom of your answer."""
 
-def generate_answer(state: InterviewState):
+def generate_answer(state: InterviewState, config: RunnableConfig):
     
     """ Node to answer a question """
 
     # Get state
     analyst = state["analyst"]
     messages = state["messages"]
-    context = state["context"]
+    # Documents retrieved for this question come first and are never cut by the budget
+    turn_documents = state.get("turn_documents", [])
+    context = format_context(state["context"][state.get("context_start", 0):], config,
+                             current=turn_documents[-1] if turn_documents else 0)
 
     # Answer question
-    system_message = answer_instructions.format(goals=analyst.persona, context=context)
+    system_message = answer_instructions.format(goals=analyst.persona, context=context) + digest_section(state)
     answer = llm.invoke([SystemMessage(content=system_message)]+messages)
             
     # Name the message as coming from the expert
@@ -248,6 +435,52 @@ def generate_answer(state: InterviewState):
     # Append it to state
     return {"messages": [answer]}
 
+# Compress older turns of the interview into a running digest
+digest_instructions = """You are keeping a running digest of an interview between an analyst and an expert.
+
+Here is the digest so far:
+
+{digest}
+
+Update it with the turns of the interview given by the user.
+
+1. Keep every specific fact, number and example, and the source IDs cited for them in brackets (e.g., [S1a2b3c]) exactly as written.
+
+2. Keep the questions the analyst already asked, so they are not asked again.
+
+3. Drop greetings, repetition and filler.
+
+4. Use at most {max_words} words. Include no preamble."""
+
+def digest_section(state: InterviewState) -> str:
+    """ The digest of the compressed turns, for the system message of the interview prompts """
+    if not state.get("digest"):
+        return ""
+    return f"\n\nDigest of the earlier turns of the interview:\n\n{state['digest']}"
+
+def compress_context(state: InterviewState, config: RunnableConfig):
+
+    """ Replace the turns before the last ones, and their source docs, by a running digest """
+
+    configurable = configuration.Configuration.from_runnable_config(config)
+    keep = max(1, configurable.context_compression)
+    messages = state["messages"]
+    older = messages[:-2 * keep]
+    if not older:
+        return {}
+
+    system_message = digest_instructions.format(digest=state.get("digest") or "Nothing yet.", max_words=300)
+    digest = llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content=get_buffer_string(older))])
+
+    # Source docs of the compressed turns are only cited through the digest from now on
+    turn_documents = state.get("turn_documents", [])
+    answers = len([m for m in older if isinstance(m, AIMessage) and m.name == "expert"])
+    return {"digest": digest.content,
+            "messages": [RemoveMessage(id=m.id) for m in older],
+            "transcript": [blobs.put(get_buffer_string(older))],
+            "compressed_turns": state.get("compressed_turns", 0) + answers,
+            "context_start": sum(turn_documents[:-keep])}
+
 def save_interview(state: InterviewState):
     
     """ Save interviews """
@@ -255,13 +488,17 @@ def save_interview(state: InterviewState):
     # Get messages
     messages = state["messages"]
     
-    # Convert interview to a string
-    interview = get_buffer_string(messages)
+    # Convert interview to a string, compressed turns come from the blob store
+    interview = "\n".join([blobs.get(part) for part in state.get("transcript", [])] + [get_buffer_string(messages)])
+
+    # No later turn will collect searches that are still running
+    discard(state.get("pending_searches", []))
     
     # Save to interviews key
-    return {"interview": interview}
+    return {"interview": interview, "pending_searches": []}
 
 def route_messages(state: InterviewState, 
+                   config: RunnableConfig,
                    name: str = "expert"):
 
     """ Route between question and answer """
@@ -270,10 +507,17 @@ def route_messages(state: InterviewState,
     messages = state["messages"]
     max_num_turns = state.get('max_num_turns',2)
 
-    # Check the number of expert answers 
+    # Shorten the interview when the run budget is running low, end it when it is used up
+    level = budget_level(config)
+    if level == EXHAUSTED:
+        return 'save_interview'
+    if level == LOW:
+        max_num_turns = max(1, max_num_turns // 2)
+
+    # Check the number of expert answers, including the compressed ones
     num_responses = len(
         [m for m in messages if isinstance(m, AIMessage) and m.name == name]
-    )
+    ) + state.get("compressed_turns", 0)
 
     # End if expert has answered more than the max turns
     if num_responses >= max_num_turns:
@@ -285,6 +529,10 @@ def route_messages(state: InterviewState,
     
     if "Thank you so much for your help" in last_question.content:
         return 'save_interview'
+
+    # Compress the older turns before the next question, if enabled
+    if configuration.Configuration.from_runnable_config(config).context_compression:
+        return "compress_context"
     return "ask_question"
 
 # Write a summary (section of the final report) of the interview
@@ -293,7 +541,7 @@ section_writer_instructions = """You are an expert technical writer.
 Your task is to create a short, easily digestible section of a report based on a set of source documents.
 
 1. Analyze the content of the source documents: 
-- The name of each source document is at the start of the document, with the <Document tag.
+- The ID of each source document is at the start of the document, with the <Document tag.
         
 2. Create a report structure using markdown formatting:
 - Use ## for the section title
@@ -302,7 +550,6 @@ Your task is to create a short, easily digestible section of a report based on a
 3. Write the report following this structure:
 a. Title (## header)
 b. Summary (### header)
-c. Sources (### header)
 
 4. Make your title engaging based upon the focus area of the analyst: 
 {focus}
@@ -310,88 +557,175 @@ c. Sources (### header)
 5. For the summary section:
 - Set up summary with general background / context related to the focus area of the analyst
 - Emphasize what is novel, interesting, or surprising about insights gathered from the interview
-- Create a numbered list of source documents, as you use them
 - Do not mention the names of interviewers or experts
-- Aim for approximately 400 words maximum
-- Use numbered sources in your report (e.g., [1], [2]) based on information from source documents
+- Aim for approximately {max_words} words maximum
+- Cite source documents by their ID in brackets (e.g., [S1a2b3c]) next to the information taken from them
         
-6. In the Sources section:
-- Include all sources used in your report
-- Provide full links to relevant websites or specific document paths
-- Separate each source by a newline. Use two spaces at the end of each line to create a newline in Markdown.
-- It will look like:
-
-### Sources
-[1] Link or Document name
-[2] Link or Document name
-
-7. Be sure to combine sources. For example this is not correct:
-
-[3] https://ai.meta.com/blog/meta-llama-3-1/
-[4] https://ai.meta.com/blog/meta-llama-3-1/
-
-There should be no redundant sources. It should simply be:
-
-[3] https://ai.meta.com/blog/meta-llama-3-1/
+6. Do not add a Sources section and do not renumber the sources, the bibliography is added automatically.
         
-8. Final review:
+7. Final review:
 - Ensure the report follows the required structure
 - Include no preamble before the title of the report
 - Check that all guidelines have been followed"""
 
-def write_section(state: InterviewState):
+# Section length for each run budget level
+section_max_words = {OK: 400, LOW: 200, EXHAUSTED: 100}
+
+def write_section(state: InterviewState, config: RunnableConfig):
 
     """ Node to write a section """
 
     # Get state
     interview = state["interview"]
-    context = state["context"]
+    context = format_context(state["context"], config)
     analyst = state["analyst"]
    
     # Write section using either the gathered source docs from interview (context) or the interview itself (interview)
-    system_message = section_writer_instructions.format(focus=analyst.description)
+    max_words = section_max_words[budget_level(config)]
+    system_message = section_writer_instructions.format(focus=analyst.description, max_words=max_words)
     section = llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content=f"Use this source to write your section: {context}")]) 
                 
     # Append it to state
     return {"sections": [section.content]}
 
+# Transient model or search errors are retried in place. A branch that still fails stops the
+# run, with a checkpointer it can then be resumed on its own (see resume.py)
+interview_retry = RetryPolicy(max_attempts=3)
+
 # Add nodes and edges 
 interview_builder = StateGraph(InterviewState)
-interview_builder.add_node("ask_question", generate_question)
-interview_builder.add_node("search_web", search_web)
-interview_builder.add_node("search_wikipedia", search_wikipedia)
-interview_builder.add_node("answer_question", generate_answer)
+interview_builder.add_node("ask_question", generate_question, retry=interview_retry)
+interview_builder.add_node("retrieve", retrieve, retry=interview_retry)
+interview_builder.add_node("answer_question", generate_answer, retry=interview_retry)
+interview_builder.add_node("compress_context", compress_context, retry=interview_retry)
 interview_builder.add_node("save_interview", save_interview)
-interview_builder.add_node("write_section", write_section)
+interview_builder.add_node("write_section", write_section, retry=interview_retry)
 
 # Flow
 interview_builder.add_edge(START, "ask_question")
-interview_builder.add_edge("ask_question", "search_web")
-interview_builder.add_edge("ask_question", "search_wikipedia")
-interview_builder.add_edge("search_web", "answer_question")
-interview_builder.add_edge("search_wikipedia", "answer_question")
-interview_builder.add_conditional_edges("answer_question", route_messages,['ask_question','save_interview'])
+interview_builder.add_edge("ask_question", "retrieve")
+interview_builder.add_edge("retrieve", "answer_question")
+interview_builder.add_conditional_edges("answer_question", route_messages,['ask_question','compress_context','save_interview'])
+interview_builder.add_edge("compress_context", "ask_question")
 interview_builder.add_edge("save_interview", "write_section")
 interview_builder.add_edge("write_section", END)
 
+interview_graph = interview_builder.compile()
+
+# Bounds how many interviews run at once (each one fans out again into the searches)
+interview_scheduler = InterviewScheduler()
+
+# Interviews started while the analysts wait at the human_feedback interrupt (see speculation.py)
+speculator = Speculator()
+
+def interview_input(topic: str, analyst: Analyst, max_num_turns: int, priority: int = 0) -> dict:
+    """ Initial state of the interview of an analyst """
+    return {"analyst": analyst,
+            "topic": topic,
+            "priority": priority,
+            "max_num_turns": max_num_turns,
+            "messages": [HumanMessage(content=f"So you said you were writing an article on {topic}?")]}
+
+def speculation_key(state: dict) -> tuple:
+    """ Speculative interviews are adopted only for the same analyst, opening question and length """
+    return state["analyst"].key, state["messages"][0].content, state["max_num_turns"]
+
+def thread_id(config: RunnableConfig):
+    return (config or {}).get("configurable", {}).get("thread_id")
+
+def reused_interview(state: dict, config: RunnableConfig):
+    """ Sections and sources of a past interview similar enough to this one, if reuse is enabled """
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if not configurable.reuse_min_similarity:
+        return None
+    past = reuse_index.similar_interview(state.get("topic", ""), state["analyst"].model_dump(),
+                                         configurable.reuse_min_similarity)
+    return {"sections": past[1], "sources": past[2]} if past else None
+
+def run_interview(graph, state: dict, config: RunnableConfig) -> dict:
+    """ Run one interview as soon as the scheduler admits it """
+    configurable = configuration.Configuration.from_runnable_config(config)
+    # Up to four steps per turn (ask_question, retrieve, answer_question, compress_context), then two to write up
+    recursion_limit = max(config.get("recursion_limit", 25), 4 * state.get("max_num_turns", 2) + 4)
+    with interview_scheduler.slot(state.get("priority", 0), configurable.max_concurrent_interviews):
+        return graph.invoke(state, {**config, "recursion_limit": recursion_limit})
+
+def speculate_interviews(state: GenerateAnalystsState, analysts: list, config: RunnableConfig):
+    """ Start the interviews of proposed analysts in the background, if speculation is enabled """
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if not configurable.speculation_max_tokens or thread_id(config) is None:
+        return
+    # Analysts interviewed in an earlier round keep their interview, behind the approved ones in the scheduler
+    interviews = state.get("interviews") or {}
+    inputs = [interview_input(state["topic"], analyst, state.get("max_num_turns", 2), priority=len(analysts) + i)
+              for i, analyst in enumerate(analysts) if analyst.key not in interviews]
+    inputs = [s for s in inputs if reused_interview(s, config) is None]
+    # Outside of the graph run: no checkpointer, only the configurable fields and the thread
+    # (whose budget they count against), and the callbacks of this node so the interviews
+    # are traced and budgeted with the run
+    speculator.start(thread_id(config), {speculation_key(s): s for s in inputs},
+                     lambda state, config: run_interview(interview_graph, state, config),
+                     {"configurable": {**asdict(configurable), "thread_id": thread_id(config)},
+                      "callbacks": config.get("callbacks")},
+                     configurable.speculation_max_tokens)
+
+def conduct_interview(state: dict, config: RunnableConfig):
+
+    """ Reuse a past interview, adopt the speculative interview of the analyst, or run it now """
+
+    interview = reused_interview(state, config)
+    if interview is not None and thread_id(config):
+        speculator.cancel(thread_id(config), speculation_key(state))
+    if interview is None:
+        interview = speculator.adopt(thread_id(config), speculation_key(state)) if thread_id(config) else None
+        if interview is None:
+            # interview_graph is named here so LangGraph sees it as the subgraph of this node
+            interview = run_interview(interview_graph, state, config)
+        reuse_index.add_interview(state.get("topic", ""), state["analyst"].model_dump(),
+                                  interview["sections"], interview.get("sources", {}))
+
+    # Only the report keys go back to the outer graph
+    return {"sections": interview["sections"],
+            "sources": interview.get("sources", {}),
+            "interviews": {state["analyst"].key: interview["sections"]}}
+
+def analysts_approved(state: ResearchGraphState) -> bool:
+    human_analyst_feedback=state.get('human_analyst_feedback','approve')
+    return human_analyst_feedback.lower() == 'approve' and not state.get('analyst_feedback')
+
+def interview_inputs(state: ResearchGraphState) -> list[dict]:
+    """ Initial states of the interviews to run once the analysts are approved """
+    # Analysts that are unchanged since their interview are not interviewed again
+    interviews = state.get("interviews") or {}
+    analysts = [analyst for analyst in state["analysts"] if analyst.key not in interviews]
+
+    # Approved analysts first, then the order they were generated in
+    approved = state.get("approved_analysts") or []
+    analysts = sorted(analysts, key=lambda analyst: analyst.name not in approved)
+    return [interview_input(state["topic"], analyst, state.get("max_num_turns", 2), priority)
+            for priority, analyst in enumerate(analysts)]
+
+def discard_speculation(state: ResearchGraphState, config: RunnableConfig):
+    """ Cancel the speculative interviews that will not be adopted once the analysts are approved """
+    # On feedback create_analysts decides what to keep when it speculates on the new analysts
+    if analysts_approved(state) and thread_id(config) is not None:
+        speculator.discard(thread_id(config), keep={speculation_key(s) for s in interview_inputs(state)})
+
 def initiate_all_interviews(state: ResearchGraphState):
 
     """ Conditional edge to initiate all interviews via Send() API or return to create_analysts """    
 
     # Check if human feedback
-    human_analyst_feedback=state.get('human_analyst_feedback','approve')
-    if human_analyst_feedback.lower() != 'approve':
+    if not analysts_approved(state):
         # Return to create_analysts
         return "create_analysts"
 
     # Otherwise kick off interviews in parallel via Send() API
     else:
-        topic = state["topic"]
-        return [Send("conduct_interview", {"analyst": analyst,
-                                           "messages": [HumanMessage(
-                                               content=f"So you said you were writing an article on {topic}?"
-                                           )
-                                                       ]}) for analyst in state["analysts"]]
+        inputs = interview_inputs(state)
+        if not inputs:
+            return ["write_report", "write_introduction", "write_conclusion"]
+        return [Send("conduct_interview", s) for s in inputs]
 
 # Write a report based on the interviews
 report_writer_instructions = """You are a technical writer creating a report on this overall topic: 
@@ -417,23 +751,24 @@ To format your report:
 3. Use no sub-heading. 
 4. Start your report with a single title header: ## Insights
 5. Do not mention any analyst names in your report.
-6. Preserve any citations in the memos, which will be annotated in brackets, for example [1] or [2].
-7. Create a final, consolidated list of sources and add to a Sources section with the `## Sources` header.
-8. List your sources in order and do not repeat.
-
-[1] Source 1
-[2] Source 2
+6. Preserve any citations in the memos exactly as written, which will be annotated with source IDs in brackets, for example [S1a2b3c].
+7. Do not add a Sources section, the bibliography is added automatically.
 
 Here are the memos from your analysts to build your report from: 
 
 {context}"""
 
+def report_sections(state: ResearchGraphState) -> list:
+    """ Sections of the current analysts, in analyst order (sections is in completion order) """
+    interviews = state.get("interviews") or {}
+    return [section for analyst in state["analysts"] for section in interviews.get(analyst.key, [])]
+
 def write_report(state: ResearchGraphState):
 
     """ Node to write the final report body """
 
     # Full set of sections
-    sections = state["sections"]
+    sections = report_sections(state)
     topic = state["topic"]
 
     # Concat all sections together
@@ -455,6 +790,8 @@ The user will instruct you whether to write the introduction or conclusion.
 
 Include no pre-amble for either section.
 
+Do not include any citations.
+
 Target around 100 words, crisply previewing (for introduction) or recapping (for conclusion) all of the sections of the report.
 
 Use markdown formatting. 
@@ -472,7 +809,7 @@ def write_introduction(state: ResearchGraphState):
     """ Node to write the introduction """
 
     # Full set of sections
-    sections = state["sections"]
+    sections = report_sections(state)
     topic = state["topic"]
 
     # Concat all sections together
@@ -489,7 +826,7 @@ def write_conclusion(state: ResearchGraphState):
     """ Node to write the conclusion """
 
     # Full set of sections
-    sections = state["sections"]
+    sections = report_sections(state)
     topic = state["topic"]
 
     # Concat all sections together
@@ -506,36 +843,33 @@ def finalize_report(state: ResearchGraphState):
     """ The is the "reduce" step where we gather all the sections, combine them, and reflect on them to write the intro/conclusion """
 
     # Save full final report
-    content = state["content"]
-    if content.startswith("## Insights"):
-        content = content.strip("## Insights")
-    if "## Sources" in content:
-        try:
-            content, sources = content.split("\n## Sources\n")
-        except:
-            sources = None
-    else:
-        sources = None
+    content = state["content"].removeprefix("## Insights")
+    final_report = state["introduction"] + "\n\n---\n\n" + content.strip() + "\n\n---\n\n" + state["conclusion"]
 
-    final_report = state["introduction"] + "\n\n---\n\n" + content + "\n\n---\n\n" + state["conclusion"]
-    if sources is not None:
-        final_report += "\n\n## Sources\n" + sources
+    # Number the cited sources in order of appearance and build the bibliography from the registry
+    final_report, bibliography = build_bibliography(final_report, state.get("sources", {}))
+    if bibliography:
+        final_report += "\n\n## Sources\n" + bibliography
     return {"final_report": final_report}
 
 # Add nodes and edges 
-builder = StateGraph(ResearchGraphState)
-builder.add_node("create_analysts", create_analysts)
-builder.add_node("human_feedback", human_feedback)
-builder.add_node("conduct_interview", interview_builder.compile())
-builder.add_node("write_report",write_report)
-builder.add_node("write_introduction",write_introduction)
-builder.add_node("write_conclusion",write_conclusion)
-builder.add_node("finalize_report",finalize_report)
+builder = StateGraph(ResearchGraphState, config_schema=configuration.Configuration)
+# Every node counts against the run_max_* budget of the thread (see budget.py)
+builder.add_node("create_analysts", budgeted(create_analysts))
+builder.add_node("human_feedback", budgeted(human_feedback))
+builder.add_node("discard_speculation", budgeted(discard_speculation))
+builder.add_node("conduct_interview", budgeted(conduct_interview))
+builder.add_node("write_report",budgeted(write_report))
+builder.add_node("write_introduction",budgeted(write_introduction))
+builder.add_node("write_conclusion",budgeted(write_conclusion))
+builder.add_node("finalize_report",budgeted(finalize_report))
 
 # Logic
 builder.add_edge(START, "create_analysts")
 builder.add_edge("create_analysts", "human_feedback")
-builder.add_conditional_edges("human_feedback", initiate_all_interviews, ["create_analysts", "conduct_interview"])
+builder.add_edge("human_feedback", "discard_speculation")
+builder.add_conditional_edges("discard_speculation", initiate_all_interviews,
+                              ["create_analysts", "conduct_interview", "write_report", "write_introduction", "write_conclusion"])
 builder.add_edge("conduct_interview", "write_report")
 builder.add_edge("conduct_interview", "write_introduction")
 builder.add_edge("conduct_interview", "write_conclusion")
@@ -0,0 +1,52 @@
+from langgraph.types import StateSnapshot
+
+# Resume a research run that stopped because some interviews failed.
+#
+# Compiled with a checkpointer, every conduct_interview branch is checkpointed on its
+# own: a branch that finished keeps its sections as a pending write of the superstep,
+# and the interview subgraph of a branch that failed is checkpointed node by node.
+# Resuming the thread only runs the branches that failed or never finished, each one
+# from the interview node that failed, and the report is written from the saved
+# sections plus the new ones.
+#
+#   graph = builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+#   ...
+#   try:
+#       graph.invoke(None, config)
+#   except Exception:
+#       print(interview_status(graph, config))
+#       result = resume_interviews(graph, config)
+
+BRANCH_NODE = "conduct_interview"
+
+def interview_status(graph, config: dict) -> list[dict]:
+    """ Interview branches waiting on this thread: analyst, status (done / failed / missing) and error """
+    snapshot = graph.get_state(config, subgraphs=True)
+    branches = []
+    for task in snapshot.tasks:
+        if task.name != BRANCH_NODE:
+            continue
+        if task.error:
+            status = "failed"
+        elif task.result is not None:
+            status = "done"
+        else:
+            status = "missing"
+        # The interview subgraph state knows the analyst, once the branch has started
+        analyst = task.state.values.get("analyst") if isinstance(task.state, StateSnapshot) else None
+        branches.append({
+            "task": task.id,
+            "analyst": getattr(analyst, "name", None),
+            "status": status,
+            "error": task.error,
+            "sections": len((task.result or {}).get("sections", [])),
+        })
+    return branches
+
+def resume_interviews(graph, config: dict) -> dict:
+    """ Re-run the failed or missing interviews of a stopped run and finish the report """
+    branches = interview_status(graph, config)
+    if not branches:
+        raise ValueError(f"No interviews to resume on thread {config['configurable'].get('thread_id')}")
+    # Finished branches are not run again, their writes are applied from the checkpoint
+    return graph.invoke(None, config)
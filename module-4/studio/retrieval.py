@@ -0,0 +1,134 @@
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable
+
+# Hedged retrieval: one query is sent to every provider at once and the caller moves on
+# as soon as it has enough results or the deadline passes. Searches that are still
+# running are parked under a token; the next turn can pick up their results with
+# collect() instead of waiting for them now.
+#
+# Every search runs on a thread of its own rather than on a shared pool: a provider call
+# that hangs only ever holds its own thread, and cannot use up the workers that later
+# searches (and their deadlines) depend on.
+#
+# A parked search is dropped once it has been parked for PARKED_TTL seconds, collected
+# or not: the branch that parked it may have failed, or been abandoned at an interrupt,
+# before it could collect or discard it.
+
+PARKED_TTL = 600.0
+
+_pending: dict[str, tuple[str, Future, float]] = {} # Token -> provider name, search, time parked
+_lock = threading.Lock()
+
+def _result_count(result: Any) -> int:
+    # Providers return (documents, sources)
+    return len(result[0]) if isinstance(result, tuple) else len(result)
+
+def _start(search: Callable[[], Any]) -> Future:
+    """ Run search on a new daemon thread """
+    future = Future()
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(search())
+        except BaseException as error:
+            future.set_exception(error)
+    threading.Thread(target=run, name="retrieval", daemon=True).start()
+    return future
+
+def _timed(name: str, search: Callable[[], Any], stats: dict) -> Callable[[], Any]:
+    def run():
+        start = time.perf_counter()
+        try:
+            return search()
+        except Exception as error:
+            stats[name]["error"] = repr(error)
+            raise
+        finally:
+            stats[name]["seconds"] = round(time.perf_counter() - start, 4)
+    return run
+
+def hedged_search(searches: dict[str, Callable[[], Any]], min_results: int = 0,
+                  deadline: float = 0) -> tuple[dict[str, Any], list[str], dict[str, dict]]:
+    """ Run all searches concurrently
+
+    Returns the results of the searches that finished by provider name, tokens for the
+    ones still running and per provider stats (seconds, error, late). min_results <= 0
+    waits for every provider, deadline <= 0 means no deadline. A provider that fails
+    is dropped unless none of them succeeded.
+    """
+    stats = {name: {"seconds": None, "error": None, "late": False} for name in searches}
+    futures = {_start(_timed(name, search, stats)): name for name, search in searches.items()}
+    end = time.monotonic() + deadline if deadline > 0 else None
+    results, errors = {}, []
+    running = set(futures)
+
+    while running:
+        timeout = None if end is None else max(0.0, end - time.monotonic())
+        done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as error:
+                errors.append(error)
+        if min_results > 0 and sum(map(_result_count, results.values())) >= min_results:
+            break
+        if end is not None and time.monotonic() >= end:
+            break
+
+    if errors and not results and not running:
+        raise errors[0]
+    for future in running:
+        stats[futures[future]]["late"] = True
+    return results, park({futures[future]: future for future in running}), stats
+
+def park(futures: dict[str, Future]) -> list[str]:
+    """ Keep still running searches for a later turn """
+    tokens, now = [], time.monotonic()
+    with _lock:
+        _expire(now)
+        for name, future in futures.items():
+            token = f"{name}:{uuid.uuid4().hex}"
+            _pending[token] = (name, future, now)
+            tokens.append(token)
+    return tokens
+
+def _expire(now: float):
+    """ Drop the searches parked for longer than PARKED_TTL, with _lock held """
+    for token in [token for token, (_, _, parked) in _pending.items() if now - parked > PARKED_TTL]:
+        _pending.pop(token)[1].cancel()
+
+def collect(tokens: list[str], timeout: float = 0) -> tuple[dict[str, list], list[str]]:
+    """ Results of parked searches that have finished since, and the tokens still running
+
+    timeout > 0 first waits up to that many seconds for the searches to finish.
+    """
+    if timeout > 0:
+        with _lock:
+            futures = [_pending[token][1] for token in tokens if token in _pending]
+        wait(futures, timeout=timeout)
+    results, running = {}, []
+    with _lock:
+        _expire(time.monotonic())
+        for token in tokens:
+            if token not in _pending:
+                continue
+            name, future, _ = _pending[token]
+            if not future.done():
+                running.append(token)
+                continue
+            del _pending[token]
+            if future.exception() is None:
+                results.setdefault(name, []).append(future.result())
+    return results, running
+
+def discard(tokens: list[str]):
+    """ Drop parked searches nobody will collect """
+    with _lock:
+        for token in tokens:
+            entry = _pending.pop(token, None)
+            if entry:
+                entry[1].cancel()
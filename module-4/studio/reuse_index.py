@@ -0,0 +1,124 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+from typing import Optional
+
+from text_utils import tokenize
+
+# Local index of past research runs, so a run on a topic close to one researched before
+# does not start cold. It keeps the analysts generated for each topic and the sections
+# (with their sources) written by each interview, keyed by lexical signatures of the
+# topic and of the analyst's fields. Similarity is the cosine of their term counts.
+#
+#   RESEARCH_REUSE_INDEX=runs/reuse.sqlite
+#
+# Runs are always recorded once the path is set; reuse is decided per run by the
+# reuse_min_similarity configurable (see configuration.py). Lookups scan the table,
+# which is fine for the few thousand runs a local index holds.
+
+def signature(text: str) -> Counter:
+    return Counter(tokenize(text))
+
+# The persona of an analyst, by field values only: labels like the "Name:" and "Role:" of
+# Analyst.persona are in every persona and would make any two of them look alike
+PERSONA_FIELDS = ("name", "role", "affiliation", "description")
+
+def persona_text(analyst: dict) -> str:
+    return "\n".join(str(analyst.get(field) or "") for field in PERSONA_FIELDS)
+
+def similarity(a: Counter, b: Counter) -> float:
+    """ Cosine similarity of two term counts, 0 to 1 """
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    if not dot:
+        return 0.0
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysts (topic TEXT, topic_terms TEXT, analysts TEXT, created REAL);
+CREATE TABLE IF NOT EXISTS interviews (topic TEXT, topic_terms TEXT, persona TEXT, persona_terms TEXT,
+                                       sections TEXT, sources TEXT, created REAL);
+"""
+
+class ReuseIndex:
+    """ SQLite index of past analysts and interview sections, disabled when path is None """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with closing(self._connect()) as db, db:
+                db.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "ReuseIndex":
+        return cls(os.environ.get("RESEARCH_REUSE_INDEX") or None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per call, nodes run on different threads
+        return sqlite3.connect(self.path)
+
+    def _rows(self, query: str) -> list:
+        with self._lock, closing(self._connect()) as db, db:
+            return db.execute(query).fetchall()
+
+    def _insert(self, query: str, values: tuple):
+        with self._lock, closing(self._connect()) as db, db:
+            db.execute(query, values)
+
+    ### Analysts
+
+    def add_analysts(self, topic: str, analysts: list[dict]):
+        if self.enabled:
+            self._insert("INSERT INTO analysts VALUES (?, ?, ?, ?)",
+                         (topic, json.dumps(signature(topic)), json.dumps(analysts), time.time()))
+
+    def similar_analysts(self, topic: str, min_similarity: float, count: int) -> Optional[tuple[float, list[dict]]]:
+        """ Analysts of the most similar past topic with at least count analysts, newest first on ties """
+        if not self.enabled:
+            return None
+        terms = signature(topic)
+        best = None
+        for past_terms, analysts, created in self._rows("SELECT topic_terms, analysts, created FROM analysts"):
+            analysts = json.loads(analysts)
+            score = similarity(terms, Counter(json.loads(past_terms)))
+            if score >= min_similarity and len(analysts) >= count and (best is None or (score, created) > best[:2]):
+                best = (score, created, analysts[:count])
+        return (best[0], best[2]) if best else None
+
+    ### Interviews
+
+    def add_interview(self, topic: str, analyst: dict, sections: list, sources: dict):
+        if self.enabled:
+            persona = persona_text(analyst)
+            self._insert("INSERT INTO interviews VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (topic, json.dumps(signature(topic)), persona, json.dumps(signature(persona)),
+                          json.dumps(sections), json.dumps(sources), time.time()))
+
+    def similar_interview(self, topic: str, analyst: dict, min_similarity: float) -> Optional[tuple[float, list, dict]]:
+        """ Sections and sources of the past interview closest in both topic and persona """
+        if not self.enabled:
+            return None
+        topic_terms, persona_terms = signature(topic), signature(persona_text(analyst))
+        best = None
+        for past_topic, past_persona, sections, sources, created in self._rows(
+                "SELECT topic_terms, persona_terms, sections, sources, created FROM interviews"):
+            score = min(similarity(topic_terms, Counter(json.loads(past_topic))),
+                        similarity(persona_terms, Counter(json.loads(past_persona))))
+            if score >= min_similarity and (best is None or (score, created) > best[:2]):
+                best = (score, created, sections, sources)
+        return (best[0], json.loads(best[2]), json.loads(best[3])) if best else None
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {}
+        return {table: self._rows(f"SELECT COUNT(*) FROM {table}")[0][0] for table in ("analysts", "interviews")}
@@ -0,0 +1,44 @@
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+class InterviewScheduler:
+    """ Admits a bounded number of interviews at a time, lowest priority value first
+
+    Every conduct_interview branch asks for a slot before it starts. Branches that do
+    not get one wait (without holding any interview state or provider connections) and
+    are admitted in priority order as running interviews finish. The bound is process
+    wide, so concurrent runs share the same provider budget.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._order = itertools.count()
+        self.running = 0
+        self.peak = 0
+
+    @contextmanager
+    def slot(self, priority: int, max_in_flight: int):
+        """ Block until the interview may start. max_in_flight <= 0 disables the bound """
+        if max_in_flight <= 0:
+            yield
+            return
+
+        ticket = (priority, next(self._order))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while self._waiting[0] != ticket or self.running >= max_in_flight:
+                self._condition.wait()
+            heapq.heappop(self._waiting)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            # The next ticket in line may also fit
+            self._condition.notify_all()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.running -= 1
+                self._condition.notify_all()
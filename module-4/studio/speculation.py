@@ -0,0 +1,170 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Speculative interviews: while the graph waits at the human_feedback interrupt, the
+# interviews of the proposed analysts already run in the background. On approval
+# conduct_interview adopts the result (waiting for it if it is still running) instead of
+# interviewing again. When the analysts are rejected or replaced, their speculative
+# interviews are cancelled and discarded. Speculative spend is capped in tokens per
+# thread; once the cap is reached the remaining speculation is cancelled and those
+# interviews simply run after approval as usual.
+#
+# Speculative interviews run with the callbacks of the node that started them, so they
+# are traced with the run and count against its RunBudget (see budget.py). A thread is
+# dropped once none of its interviews is left to adopt; only its counts are kept.
+
+class SpeculationCancelled(RuntimeError):
+    """ Raised inside a speculative interview to stop it """
+
+@dataclass
+class _Speculation:
+    future: Future
+    cancelled: threading.Event
+
+@dataclass
+class _Thread:
+    max_tokens: int = 0
+    spent: int = 0
+    started: int = 0
+    adopted: int = 0
+    cancelled: int = 0
+    running: dict = field(default_factory=dict) # key -> _Speculation
+
+class _Guard(BaseCallbackHandler):
+    """ Stops a speculative interview at its next model call once cancelled or over the cap """
+
+    raise_error = True
+
+    def __init__(self, thread: _Thread, cancelled: threading.Event, lock: threading.Lock):
+        self.thread = thread
+        self.cancelled = cancelled
+        self.lock = lock
+
+    def _check(self):
+        if self.cancelled.is_set():
+            raise SpeculationCancelled("analyst rejected")
+        if self.thread.spent >= self.thread.max_tokens:
+            raise SpeculationCancelled("speculation spend cap reached")
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        self._check()
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self._check()
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                tokens += usage.get("total_tokens", 0)
+        with self.lock:
+            self.thread.spent += tokens
+
+def _with_handler(callbacks, handler: BaseCallbackHandler):
+    """ The run callbacks (a list or a node's callback manager) with one more handler """
+    if callbacks is None:
+        return [handler]
+    if isinstance(callbacks, list):
+        return [*callbacks, handler]
+    callbacks = callbacks.copy()
+    callbacks.add_handler(handler, inherit=True)
+    return callbacks
+
+class Speculator:
+    """ Background interviews per graph thread, adopted on approval or discarded """
+
+    # Threads never approved are dropped, least recently speculated first, beyond this many,
+    # and the counts of this many finished threads are kept for stats()
+    MAX_THREADS = 1024
+
+    def __init__(self, max_workers: int = 8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculation")
+        self._threads: OrderedDict[str, _Thread] = OrderedDict()
+        self._finished: OrderedDict[str, _Thread] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, thread_id: str, inputs: dict[Hashable, dict], run: Callable[[dict, dict], Any],
+              config: dict, max_tokens: int):
+        """ Speculate on exactly these interviews: start the missing ones, cancel the others
+
+        config is the config of the node speculating, its callbacks are passed on to the interviews.
+        """
+        with self._lock:
+            thread = self._threads.pop(thread_id, None) or self._finished.pop(thread_id, None) or _Thread()
+            self._threads[thread_id] = thread
+            while len(self._threads) > self.MAX_THREADS:
+                self._finish(*self._threads.popitem(last=False))
+            thread.max_tokens = max_tokens
+            for key in [key for key in thread.running if key not in inputs]:
+                self._cancel(thread, key)
+            for key, state in inputs.items():
+                if key in thread.running or thread.spent >= max_tokens:
+                    continue
+                cancelled = threading.Event()
+                guarded = {**config, "callbacks": _with_handler(config.get("callbacks"), _Guard(thread, cancelled, self._lock))}
+                thread.running[key] = _Speculation(self._executor.submit(run, state, guarded), cancelled)
+                thread.started += 1
+
+    def adopt(self, thread_id: str, key: Hashable) -> Optional[Any]:
+        """ Result of the speculative interview, waiting for it if needed. None if there is no usable one """
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            speculation = thread.running.pop(key, None) if thread else None
+            if thread:
+                self._finish_idle(thread_id, thread)
+        if speculation is None:
+            return None
+        try:
+            result = speculation.future.result()
+        except Exception:
+            return None
+        with self._lock:
+            thread.adopted += 1
+        return result
+
+    def discard(self, thread_id: str, keep=()):
+        """ Cancel the speculative interviews of this thread that will not be adopted """
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            if thread:
+                for key in [key for key in thread.running if key not in keep]:
+                    self._cancel(thread, key)
+                self._finish_idle(thread_id, thread)
+
+    def cancel(self, thread_id: str, key: Hashable):
+        """ Cancel one speculative interview, e.g. when a past interview is reused instead """
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            if thread and key in thread.running:
+                self._cancel(thread, key)
+                self._finish_idle(thread_id, thread)
+
+    def _finish_idle(self, thread_id: str, thread: _Thread):
+        if not thread.running:
+            self._finish(thread_id, self._threads.pop(thread_id))
+
+    def _finish(self, thread_id: str, thread: _Thread):
+        """ Forget a thread that has nothing left to adopt, keeping its counts """
+        for key in list(thread.running):
+            self._cancel(thread, key)
+        self._finished[thread_id] = thread
+        while len(self._finished) > self.MAX_THREADS:
+            self._finished.popitem(last=False)
+
+    def _cancel(self, thread: _Thread, key: Hashable):
+        speculation = thread.running.pop(key)
+        speculation.cancelled.set()
+        speculation.future.cancel()
+        thread.cancelled += 1
+
+    def stats(self, thread_id: str) -> dict:
+        with self._lock:
+            thread = self._threads.get(thread_id) or self._finished.get(thread_id) or _Thread()
+            return {"spent_tokens": thread.spent, "started": thread.started, "adopted": thread.adopted,
+                    "cancelled": thread.cancelled, "running": len(thread.running)}
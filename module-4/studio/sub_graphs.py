@@ -1,8 +1,10 @@
-from operator import add
 from typing import List, Optional, Annotated
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 
+from log_batch import LogBatch
+from processed_logs import merge_processed, processed_update
+
 # The structure of the logs
 class Log(TypedDict):
     id: str
@@ -18,15 +20,17 @@ class FailureAnalysisState(TypedDict):
     cleaned_logs: List[Log]
     failures: List[Log]
     fa_summary: str
-    processed_logs: List[str]
+    processed_logs: dict
 
 class FailureAnalysisOutputState(TypedDict):
     fa_summary: str
-    processed_logs: List[str]
+    processed_logs: dict
 
 def get_failures(state):
     """ Get logs that contain a failure """
     cleaned_logs = state["cleaned_logs"]
+    if isinstance(cleaned_logs, LogBatch):
+        return {"failures": cleaned_logs.failures()}
     failures = [log for log in cleaned_logs if "grade" in log]
     return {"failures": failures}
 
@@ -35,7 +39,8 @@ def generate_summary(state):
     failures = state["failures"]
     # Add fxn: fa_summary = summarize(failures)
     fa_summary = "Poor quality retrieval of Chroma documentation."
-    return {"fa_summary": fa_summary, "processed_logs": [f"failure-analysis-on-log-{failure['id']}" for failure in failures]}
+    ids = failures.ids if isinstance(failures, LogBatch) else [failure["id"] for failure in failures]
+    return {"fa_summary": fa_summary, "processed_logs": processed_update("failure-analysis", ids)}
 
 fa_builder = StateGraph(input=FailureAnalysisState,output=FailureAnalysisOutputState)
 fa_builder.add_node("get_failures", get_failures)
@@ -49,17 +54,18 @@ class QuestionSummarizationState(TypedDict):
     cleaned_logs: List[Log]
     qs_summary: str
     report: str
-    processed_logs: List[str]
+    processed_logs: dict
 
 class QuestionSummarizationOutputState(TypedDict):
     report: str
-    processed_logs: List[str]
+    processed_logs: dict
 
 def generate_summary(state):
     cleaned_logs = state["cleaned_logs"]
     # Add fxn: summary = summarize(generate_summary)
     summary = "Questions focused on usage of ChatOllama and Chroma vector store."
-    return {"qs_summary": summary, "processed_logs": [f"summary-on-log-{log['id']}" for log in cleaned_logs]}
+    ids = cleaned_logs.ids if isinstance(cleaned_logs, LogBatch) else [log["id"] for log in cleaned_logs]
+    return {"qs_summary": summary, "processed_logs": processed_update("summary", ids)}
 
 def send_to_slack(state):
     qs_summary = state["qs_summary"]
@@ -76,11 +82,11 @@ qs_builder.add_edge("send_to_slack", END)
 
 # Entry Graph
 class EntryGraphState(TypedDict):
-    raw_logs: List[Log]
+    raw_logs: List[Log] # Or a columnar LogBatch (see log_batch.py). For log files too large to hold at once, see log_stream.py
     cleaned_logs: List[Log]
     fa_summary: str # This will only be generated in the FA sub-graph
     report: str # This will only be generated in the QS sub-graph
-    processed_logs:  Annotated[List[int], add] # This will be generated in BOTH sub-graphs
+    processed_logs:  Annotated[dict, merge_processed] # This will be generated in BOTH sub-graphs, log ID bitmaps per sub-graph (see processed_logs.py)
 
 def clean_logs(state):
     # Get logs
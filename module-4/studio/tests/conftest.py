@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# The studio modules import each other as top level modules, like langgraph.json loads them
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The graphs create their ChatOpenAI clients on import, the tests replace them with fakes
+os.environ.setdefault("OPENAI_API_KEY", "fake")
@@ -0,0 +1,36 @@
+import pytest
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+from batching import BatchingChatModel, MicroBatcher
+from fakes import FakeChatModel
+
+class SearchQuery(BaseModel):
+    search_query: str = Field(None, description="Search query for retrieval.")
+
+@pytest.fixture
+def batcher():
+    return MicroBatcher(window=0.01)
+
+@pytest.mark.parametrize("kwargs", [{}, {"method": "json_schema"}, {"method": "json_mode"}, {"include_raw": True}])
+def test_structured_output_binds_like_the_wrapped_model(batcher, kwargs):
+    model = ChatOpenAI(model="gpt-4o", temperature=0)
+    batching = BatchingChatModel(model=model, batcher=batcher)
+    expected, bound = model.with_structured_output(SearchQuery, **kwargs), batching.with_structured_output(SearchQuery, **kwargs)
+    expected_llm, bound_llm = expected.first, bound.first
+    if kwargs.get("include_raw"):
+        expected_llm, bound_llm = expected_llm.steps__["raw"], bound_llm.steps__["raw"]
+    assert bound_llm.bound is batching
+    assert bound_llm.kwargs == expected_llm.kwargs
+    assert [type(step) for step in bound.steps[1:]] == [type(step) for step in expected.steps[1:]]
+
+def test_tools_bind_like_the_wrapped_model(batcher):
+    model = ChatOpenAI(model="gpt-4o", temperature=0)
+    bound = BatchingChatModel(model=model, batcher=batcher).bind_tools([SearchQuery], tool_choice="SearchQuery")
+    assert bound.kwargs == model.bind_tools([SearchQuery], tool_choice="SearchQuery").kwargs
+
+def test_structured_calls_go_through_the_batcher(batcher):
+    batching = BatchingChatModel(model=FakeChatModel(), batcher=batcher)
+    result = batching.with_structured_output(SearchQuery).batch(["one", "two", "three"])
+    assert all(isinstance(query, SearchQuery) for query in result)
+    assert batcher.stats()["requests"] == 3
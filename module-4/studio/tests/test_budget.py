@@ -0,0 +1,44 @@
+import time
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+
+import research_assistant
+from budget import EXHAUSTED, LOW, run_budgets
+from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+from instrumentation import GraphProfiler
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(research_assistant, "llm", FakeChatModel(array_length=3))
+    monkeypatch.setattr(research_assistant, "TavilySearchResults", FakeTavilySearch)
+    monkeypatch.setattr(research_assistant, "WikipediaLoader", FakeWikipediaLoader)
+
+def run(thread_id: str, callbacks=None, review: float = 0, **configurable) -> int:
+    """ Model calls of a research run, approved at the interrupt after review seconds """
+    graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": thread_id, **configurable}, "callbacks": callbacks}
+    calls = next(research_assistant.llm.calls)
+    graph.invoke({"topic": "Run budgets", "max_analysts": 3, "max_num_turns": 3}, config)
+    time.sleep(review)
+    graph.update_state(config, {"human_analyst_feedback": "approve"}, as_node="human_feedback")
+    graph.invoke(None, config)
+    return next(research_assistant.llm.calls) - calls - 1
+
+def test_configured_budget_is_enforced_with_other_callbacks():
+    unlimited = run("unlimited", callbacks=[GraphProfiler()])
+    limited = run("limited", callbacks=[GraphProfiler()], run_max_tokens=3000)
+    assert limited < unlimited
+    budget = run_budgets.budget({"configurable": {"thread_id": "limited", "run_max_tokens": 3000}})
+    assert budget.calls == limited
+    assert budget.level() in (LOW, EXHAUSTED)
+
+def test_budget_is_the_same_with_or_without_other_callbacks():
+    assert run("plain", run_max_tokens=3000) == run("profiled", callbacks=[GraphProfiler()], run_max_tokens=3000)
+
+def test_time_at_the_interrupt_is_not_counted():
+    start = time.monotonic()
+    run("timed", callbacks=[GraphProfiler()], review=1.0, run_max_seconds=60)
+    budget = run_budgets.budget({"configurable": {"thread_id": "timed", "run_max_seconds": 60}})
+    assert 0 < budget.elapsed < time.monotonic() - start - 1.0
+    assert budget.level() not in (LOW, EXHAUSTED)
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+import parallelization
+from bench_fanin import percentile, time_to_answer
+from fakes import FakeChatModel, FakeTavilySearch, FakeWikipediaLoader
+
+QUESTIONS = [f"Question {i}?" for i in range(10)]
+SLOW = {"Question 3?", "Question 7?"} # Wikipedia takes SPIKE seconds on these
+FAST, SPIKE = 0.02, 0.6
+
+class SlowTavilySearch(FakeTavilySearch):
+    def invoke(self, query: str) -> list[dict]:
+        time.sleep(FAST)
+        return super().invoke(query)
+
+class SlowWikipediaLoader(FakeWikipediaLoader):
+    def load(self):
+        time.sleep(SPIKE if self.query in SLOW else FAST)
+        return super().load()
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(parallelization, "llm", FakeChatModel(reply_chars=50))
+    monkeypatch.setattr(parallelization, "TavilySearchResults", SlowTavilySearch)
+    monkeypatch.setattr(parallelization, "WikipediaLoader", SlowWikipediaLoader)
+
+def run(**configurable) -> tuple[list[float], list[float], list[dict]]:
+    answers, invokes, results = [], [], []
+    for question in QUESTIONS:
+        seconds, total, result = time_to_answer(parallelization.graph, {"question": question},
+                                                {"configurable": configurable})
+        answers.append(seconds)
+        invokes.append(total)
+        results.append(result)
+    return answers, invokes, results
+
+def test_without_deadline_the_answer_waits_for_the_slowest_search():
+    answers, _, results = run()
+    assert percentile(answers, 90) >= SPIKE
+    assert all(len(result["context"]) == 2 for result in results)
+    assert all(not result.get("stragglers") for result in results)
+
+def test_deadline_bounds_the_answer_latency():
+    deadline = 0.15
+    answers, _, results = run(retrieval_deadline=deadline)
+    assert percentile(answers, 50) < deadline
+    assert percentile(answers, 99) < deadline + 0.1
+    assert max(answers) < SPIKE
+    # Fast questions still get both contexts
+    assert [len(result["context"]) for result in results] == [1 if q in SLOW else 2 for q in QUESTIONS]
+
+def test_invoke_ends_near_the_deadline():
+    deadline = 0.15
+    _, invokes, results = run(retrieval_deadline=deadline)
+    assert percentile(invokes, 99) < deadline + 0.1
+    assert max(invokes) < SPIKE
+    # The stragglers had not finished, they are recorded as such and dropped
+    late = [entry for result in results for entry in result["late_context"]]
+    assert len(late) == len(SLOW)
+    assert all(entry["context"] is None and entry["error"] == "timed out" for entry in late)
+
+def test_stragglers_are_recorded_with_their_results():
+    _, _, results = run(retrieval_deadline=0.15, straggler_timeout=2 * SPIKE)
+    for question, result in zip(QUESTIONS, results):
+        if question not in SLOW:
+            assert not result.get("stragglers") and result["late_context"] == []
+            continue
+        [straggler] = result["stragglers"]
+        assert straggler["provider"] == "search_wikipedia" and straggler["error"] is None
+        [late] = result["late_context"]
+        assert late["provider"] == "search_wikipedia" and late["error"] is None
+        # The same context the answer would have had without a deadline
+        assert late["context"] == parallelization.wikipedia_context(question)
+
+def test_stragglers_past_the_timeout_are_dropped():
+    _, _, results = run(retrieval_deadline=0.15, straggler_timeout=0.05)
+    late = [entry for result in results for entry in result["late_context"]]
+    assert len(late) == len(SLOW)
+    assert all(entry["context"] is None and entry["error"] == "timed out" for entry in late)
+
+def test_failed_search_is_a_straggler(monkeypatch):
+    def fail(question):
+        raise RuntimeError("wikipedia is down")
+    monkeypatch.setattr(parallelization, "wikipedia_context", fail)
+    result = parallelization.graph.invoke({"question": "Question 0?"}, {"configurable": {"retrieval_deadline": 0.15}})
+    assert len(result["context"]) == 1
+    assert result["stragglers"] == [{"provider": "search_wikipedia", "error": "RuntimeError('wikipedia is down')", "search": None}]
+    assert result["late_context"] == []
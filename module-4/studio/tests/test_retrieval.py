@@ -0,0 +1,23 @@
+import threading
+
+import retrieval
+
+def test_parked_searches_expire(monkeypatch):
+    release = threading.Event()
+    _, tokens, _ = retrieval.hedged_search({"slow": lambda: release.wait(5) and ["late"]}, deadline=0.01)
+    assert len(tokens) == 1 and tokens[0] in retrieval._pending
+
+    # Nobody collects or discards it, e.g. the interview failed before save_interview
+    monkeypatch.setattr(retrieval, "PARKED_TTL", 0.0)
+    retrieval.park({})
+    assert tokens[0] not in retrieval._pending
+    release.set()
+    assert retrieval.collect(tokens) == ({}, [])
+
+def test_parked_searches_are_collected_before_they_expire():
+    release = threading.Event()
+    _, tokens, _ = retrieval.hedged_search({"slow": lambda: release.wait(5) and ["late"]}, deadline=0.01)
+    assert retrieval.collect(tokens) == ({}, tokens)
+    release.set()
+    assert retrieval.collect(tokens, timeout=1) == ({"slow": [["late"]]}, [])
+    assert tokens[0] not in retrieval._pending
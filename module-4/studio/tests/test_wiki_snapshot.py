@@ -0,0 +1,55 @@
+import json
+import math
+import random
+from collections import Counter
+
+import wiki_snapshot
+
+def write_dump(path, articles: int = 200):
+    rng = random.Random(0)
+    words = [f"w{i}" for i in range(300)]
+    with open(path, "w") as f:
+        for a in range(articles):
+            text = "\n".join((f"== H{s} ==\n" if s else "") + " ".join(rng.choices(words, k=rng.randint(5, 40)))
+                             for s in range(rng.randint(1, 3)))
+            f.write(json.dumps({"title": f"Article {a}", "text": text}) + "\n")
+
+def brute_force(snapshot, directory, query: str, limit: int) -> list[tuple[float, int]]:
+    """ BM25 of every section against the query, the way search() did it with a heap """
+    sections = []
+    with open(f"{directory}/articles.tsv", encoding="utf-8") as f:
+        titles = f.read().splitlines()
+    for sid in range(snapshot.meta["sections"]):
+        article, heading, body = snapshot.section(sid)
+        sections.append(Counter(wiki_snapshot.tokenize(f"{titles[article]} {heading} {body}")))
+    n, avg = len(sections), snapshot.meta["avg_section_tokens"]
+    scores = Counter()
+    for term in set(wiki_snapshot.tokenize(query)):
+        matching = [(sid, counts[term]) for sid, counts in enumerate(sections) if term in counts]
+        idf = math.log(1 + (n - len(matching) + 0.5) / (len(matching) + 0.5))
+        for sid, frequency in matching:
+            tokens = sum(sections[sid].values())
+            scores[sid] += idf * frequency * (snapshot.k1 + 1) / (frequency + snapshot.k1 * (1 - snapshot.b + snapshot.b * tokens / avg))
+    return sorted(((score, sid) for sid, score in scores.items()), reverse=True)[:limit]
+
+def test_search_matches_brute_force_across_runs(tmp_path, monkeypatch):
+    write_dump(tmp_path / "dump.jsonl")
+    # Small runs, so the postings of most terms are merged from several of them
+    monkeypatch.setattr(wiki_snapshot, "RUN_POSTINGS", 500)
+    wiki_snapshot.build(str(tmp_path / "dump.jsonl"), str(tmp_path / "snapshot"))
+    assert not list(tmp_path.glob("snapshot/postings.run*"))
+
+    snapshot = wiki_snapshot.WikipediaSnapshot(str(tmp_path / "snapshot"))
+    rng = random.Random(1)
+    for _ in range(20):
+        query = " ".join(f"w{rng.randint(0, 320)}" for _ in range(3)) + " article"
+        expected = brute_force(snapshot, tmp_path / "snapshot", query, 8)
+        results = snapshot.search(query, 8)
+        assert [sid for _, sid in results] == [sid for _, sid in expected]
+        assert all(math.isclose(a, b) for (a, _), (b, _) in zip(results, expected))
+    assert snapshot.search("nothing matches this", 8) == []
+
+def test_empty_snapshot(tmp_path):
+    (tmp_path / "dump.jsonl").write_text("")
+    wiki_snapshot.build(str(tmp_path / "dump.jsonl"), str(tmp_path / "snapshot"))
+    assert wiki_snapshot.WikipediaSnapshot(str(tmp_path / "snapshot")).search("anything", 5) == []
@@ -0,0 +1,21 @@
+import hashlib
+import re
+
+# Text helpers shared by the offline search backends (wiki_snapshot.py, mock_search.py),
+# the reuse index (reuse_index.py) and the fakes of the benchmarks (fakes.py).
+
+STOP_WORDS = frozenset("""a an and are as at be by for from has have he her his in is it its of on or
+that the their them they this to was were which who will with what when where how not but""".split())
+
+def tokenize(text: str) -> list[str]:
+    """ Lowercase alphanumeric terms, without stop words and single characters """
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if len(t) > 1 and t not in STOP_WORDS]
+
+LOREM = ("LangGraph models agent workflows as graphs of nodes that read and write a shared state. "
+         "Parallel branches are merged with reducers and every step can be checkpointed. ")
+
+def filler_text(seed: str, size: int) -> str:
+    """ Deterministic filler text of roughly size characters """
+    digest = hashlib.sha1(seed.encode("utf-8")).hexdigest()
+    repeated = (f"[{digest[:8]}] " + LOREM) * (size // len(LOREM) + 1)
+    return repeated[:size]
@@ -0,0 +1,78 @@
+import threading
+from typing import Any, Callable, Optional
+
+# Streaming tournament: picks the best of many candidates with small, fixed size
+# comparisons that run while candidates are still arriving.
+#
+# Candidates enter the first round as they are added. As soon as a round holds
+# bracket_size of them, the caller that completed it compares them, with its own config,
+# and the winner moves on to the next round (which that caller plays as well when it
+# fills up). Other callers keep adding candidates meanwhile. result() plays out the
+# rounds that are not full yet, so the last comparisons only involve the few winners
+# left. Every comparison sees at most bracket_size candidates.
+
+class Tournament:
+    """ Single elimination bracket over candidates added one by one """
+
+    def __init__(self, compare: Callable[[list, Optional[dict]], int], bracket_size: int = 4):
+        # compare(candidates, config) returns the index of the best candidate
+        self.compare = compare
+        self.bracket_size = max(2, bracket_size)
+        self.rounds: list[list] = [[]]
+        self.comparisons = 0
+        self.playing = 0
+        self._lock = threading.Condition()
+
+    def add(self, candidate: Any, config: Optional[dict] = None):
+        """ Enter a candidate, playing the brackets it completes before returning """
+        level = 0
+        while True:
+            with self._lock:
+                while len(self.rounds) <= level:
+                    self.rounds.append([])
+                self.rounds[level].append(candidate)
+                if len(self.rounds[level]) < self.bracket_size:
+                    return
+                bracket, self.rounds[level] = self.rounds[level], []
+                self.playing += 1
+            try:
+                candidate = self._winner(bracket, config)
+            except BaseException:
+                # The bracket goes back as it was, so result() can still play it
+                with self._lock:
+                    self.rounds[level] += bracket
+                raise
+            finally:
+                with self._lock:
+                    self.playing -= 1
+                    self._lock.notify_all()
+            level += 1
+
+    def _winner(self, bracket: list, config: Optional[dict]) -> Any:
+        index = self.compare(bracket, config)
+        with self._lock:
+            self.comparisons += 1
+        # Out of range answers fall back to the first candidate
+        return bracket[index] if 0 <= index < len(bracket) else bracket[0]
+
+    def result(self, config: Optional[dict] = None) -> Any:
+        """ The winner, once every candidate has been added """
+        level = 0
+        while True:
+            with self._lock:
+                # Brackets still being played by add() finish first
+                self._lock.wait_for(lambda: self.playing == 0)
+                remaining = sum(len(candidates) for candidates in self.rounds)
+                if remaining == 0:
+                    raise ValueError("No candidates")
+                if remaining == 1:
+                    return next(candidates[0] for candidates in self.rounds if candidates)
+                while not self.rounds[level]:
+                    level += 1
+                bracket, self.rounds[level] = self.rounds[level], []
+                if level + 1 == len(self.rounds):
+                    self.rounds.append([])
+            # A lone candidate gets a bye to the next round
+            winner = bracket[0] if len(bracket) == 1 else self._winner(bracket, config)
+            with self._lock:
+                self.rounds[level + 1].append(winner)
@@ -0,0 +1,348 @@
+"""Offline, memory-mapped Wikipedia snapshot with an inverted index."""
+import bz2
+import gzip
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import xml.etree.ElementTree as ET
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Iterator
+from urllib.parse import quote
+
+import numpy as np
+from langchain_core.documents import Document
+
+from text_utils import tokenize
+
+# Alternative backend for search_wikipedia that needs no network.
+#
+# Build a snapshot once from a MediaWiki XML dump (pages-articles.xml[.bz2]) or from a
+# JSON lines dump with "title" and "text" fields:
+#
+#   python wiki_snapshot.py build simplewiki-latest-pages-articles.xml.bz2 wiki_snapshot/
+#
+# Then point the graphs at it. WikipediaSnapshotLoader has the same interface as
+# WikipediaLoader but only returns the sections of each article that match the query:
+#
+#   WIKIPEDIA_SNAPSHOT=wiki_snapshot/
+#
+# Snapshot layout (all files are memory-mapped or small):
+#   sections.bin   UTF-8 text of every article section, back to back
+#   sections.idx   per section: offset, byte length, article id, token count
+#   articles.tsv   article title per line (line number = article id)
+#   postings.bin   per term: (section id, term frequency) pairs
+#   lexicon.tsv    term, first posting, number of postings
+#   meta.json      counts and average section length for BM25
+#
+# The build keeps at most RUN_POSTINGS postings in memory: it writes them out in runs
+# and merges the runs into postings.bin, term by term, at the end. Queries score the postings of a
+# term with NumPy, straight from the mapped files.
+
+SECTION = struct.Struct("<QIII")
+POSTING = struct.Struct("<II")
+SECTION_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("article", "<u4"), ("tokens", "<u4")])
+POSTING_DTYPE = np.dtype([("section", "<u4"), ("frequency", "<u4")])
+RUN_DTYPE = np.dtype([("term", "<u4"), ("section", "<u4"), ("frequency", "<u4")])
+
+# Postings held in memory during a build before they are written out as a run
+RUN_POSTINGS = 1_000_000
+
+### Dump parsing
+
+_TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+_TABLE = re.compile(r"\{\|.*?\|\}", re.DOTALL)
+_REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL)
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_TAG = re.compile(r"<[^>]+>")
+_MEDIA = re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", re.IGNORECASE)
+_LINK = re.compile(r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]")
+_EXTERNAL = re.compile(r"\[https?://[^\s\]]+\s?([^\]]*)\]")
+_HEADING = re.compile(r"^(={2,6})\s*(.*?)\s*\1\s*$", re.MULTILINE)
+
+def clean_wikitext(text: str) -> str:
+    """ Rough wikitext to plain text, good enough for retrieval """
+    text = _COMMENT.sub("", text)
+    text = _REF.sub("", text)
+    previous = None
+    while previous != text:  # templates nest
+        previous, text = text, _TEMPLATE.sub("", text)
+    text = _TABLE.sub("", text)
+    text = _MEDIA.sub("", text)
+    text = _LINK.sub(r"\1", text)
+    text = _EXTERNAL.sub(r"\1", text)
+    text = _TAG.sub("", text)
+    text = text.replace("'''", "").replace("''", "")
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def split_sections(text: str) -> list[tuple[str, str]]:
+    """ (heading, body) pairs, the lead section has the heading "Summary" """
+    sections, heading, start = [], "Summary", 0
+    for match in _HEADING.finditer(text):
+        sections.append((heading, text[start:match.start()].strip()))
+        heading, start = match.group(2), match.end()
+    sections.append((heading, text[start:].strip()))
+    return [(heading, body) for heading, body in sections if body]
+
+def _open(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def read_dump(path: str) -> Iterator[tuple[str, str]]:
+    """ (title, wikitext) of every article in a dump """
+    with _open(path) as f:
+        if ".jsonl" in path or ".json" in path:
+            for line in f:
+                record = json.loads(line)
+                yield record["title"], record["text"]
+            return
+        title, namespace, redirect = None, None, False
+        for _, element in ET.iterparse(f, events=("end",)):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = element.text
+            elif tag == "ns":
+                namespace = element.text
+            elif tag == "redirect":
+                redirect = True
+            elif tag == "text" and namespace == "0" and not redirect and element.text:
+                yield title, element.text
+            elif tag == "page":
+                title, namespace, redirect = None, None, False
+                element.clear()
+
+### Build
+
+def _write_run(directory: str, number: int, terms: array, sections: array, frequencies: array) -> str:
+    """ Postings of a part of the dump, in section order, as (term id, section, frequency) """
+    path = os.path.join(directory, f"postings.run{number}")
+    run = np.empty(len(terms), dtype=RUN_DTYPE)
+    run["term"] = np.frombuffer(terms, dtype=np.uint32)
+    run["section"] = np.frombuffer(sections, dtype=np.uint32)
+    run["frequency"] = np.frombuffer(frequencies, dtype=np.uint32)
+    run.tofile(path)
+    return path
+
+def _merge_runs(directory: str, runs: list[str], vocabulary: dict[str, int]):
+    """ Merge the runs into postings.bin, terms in sorted order, and write the lexicon """
+    terms = sorted(vocabulary)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+
+    # Postings per term, then the runs in order: runs cover increasing section ids, so
+    # appending each run's postings of a term after the ones before keeps them in order
+    totals = np.zeros(len(terms), dtype=np.int64)
+    for path in runs:
+        totals += np.bincount(rank[np.fromfile(path, dtype=RUN_DTYPE)["term"]], minlength=len(terms))
+    starts = np.concatenate(([0], np.cumsum(totals)[:-1])).astype(np.int64)
+
+    path = os.path.join(directory, "postings.bin")
+    size = int(totals.sum())
+    if size == 0:
+        open(path, "wb").close()
+    else:
+        out = np.memmap(path, dtype=POSTING_DTYPE, mode="w+", shape=(size,))
+        filled = starts.copy() # Next free position of every term
+        for run_path in runs:
+            run = np.fromfile(run_path, dtype=RUN_DTYPE)
+            ranks = rank[run["term"]]
+            # Stable, so the sections of a term stay in order
+            order = np.argsort(ranks, kind="stable")
+            run, ranks = run[order], ranks[order]
+            first = np.concatenate(([True], ranks[1:] != ranks[:-1]))
+            group_starts = np.maximum.accumulate(np.where(first, np.arange(len(run)), 0))
+            destination = filled[ranks] + np.arange(len(run)) - group_starts
+            out["section"][destination] = run["section"]
+            out["frequency"][destination] = run["frequency"]
+            filled += np.bincount(ranks, minlength=len(terms))
+        out.flush()
+        del out
+    for run_path in runs:
+        os.remove(run_path)
+
+    with open(os.path.join(directory, "lexicon.tsv"), "w", encoding="utf-8") as lexicon:
+        for term, start, total in zip(terms, starts.tolist(), totals.tolist()):
+            lexicon.write(f"{term}\t{start}\t{total}\n")
+
+def build(dump_path: str, directory: str, max_articles: int = 0) -> dict:
+    """ Write a snapshot of the dump into directory """
+    os.makedirs(directory, exist_ok=True)
+    vocabulary: dict[str, int] = {} # Term -> id, in order of first appearance
+    terms, sections, frequencies = array("I"), array("I"), array("I")
+    runs = []
+    section_count = total_tokens = article_count = 0
+
+    with open(os.path.join(directory, "sections.bin"), "wb") as texts, \
+         open(os.path.join(directory, "sections.idx"), "wb") as index, \
+         open(os.path.join(directory, "articles.tsv"), "w", encoding="utf-8") as articles:
+        offset = 0
+        for title, wikitext in read_dump(dump_path):
+            if max_articles and article_count >= max_articles:
+                break
+            sections_of_article = split_sections(clean_wikitext(wikitext))
+            if not sections_of_article:
+                continue
+            articles.write(title.replace("\t", " ").replace("\n", " ") + "\n")
+            for heading, body in sections_of_article:
+                data = f"{heading}\n{body}".encode("utf-8")
+                # Article titles are searchable from every section of the article
+                tokens = tokenize(f"{title} {heading} {body}")
+                texts.write(data)
+                index.write(SECTION.pack(offset, len(data), article_count, len(tokens)))
+                for term, frequency in Counter(tokens).items():
+                    terms.append(vocabulary.setdefault(term, len(vocabulary)))
+                    sections.append(section_count)
+                    frequencies.append(frequency)
+                offset += len(data)
+                total_tokens += len(tokens)
+                section_count += 1
+            article_count += 1
+            if len(terms) >= RUN_POSTINGS:
+                runs.append(_write_run(directory, len(runs), terms, sections, frequencies))
+                terms, sections, frequencies = array("I"), array("I"), array("I")
+        if terms:
+            runs.append(_write_run(directory, len(runs), terms, sections, frequencies))
+
+    _merge_runs(directory, runs, vocabulary)
+
+    meta = {"articles": article_count, "sections": section_count,
+            "avg_section_tokens": total_tokens / max(section_count, 1)}
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+### Query
+
+def _map(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class WikipediaSnapshot:
+    """ Read-only, memory-mapped snapshot with BM25 search over article sections """
+
+    def __init__(self, directory: str, k1: float = 1.2, b: float = 0.75):
+        self.directory = directory
+        self.k1, self.b = k1, b
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(directory, "articles.tsv"), encoding="utf-8") as f:
+            self.titles = f.read().splitlines()
+        self.lexicon = {}
+        with open(os.path.join(directory, "lexicon.tsv"), encoding="utf-8") as f:
+            for line in f:
+                term, position, count = line.rstrip("\n").split("\t")
+                self.lexicon[term] = (int(position), int(count))
+        self.texts = _map(os.path.join(directory, "sections.bin"))
+        self.index = _map(os.path.join(directory, "sections.idx"))
+        self.postings = _map(os.path.join(directory, "postings.bin"))
+        # Array views of the mapped files, nothing is read until a query touches it
+        self.section_tokens = np.frombuffer(self.index, dtype=SECTION_DTYPE)["tokens"]
+        self.posting_array = np.frombuffer(self.postings, dtype=POSTING_DTYPE)
+
+    def section(self, section_id: int) -> tuple[int, str, str]:
+        """ (article id, heading, body) """
+        offset, length, article, _ = SECTION.unpack_from(self.index, section_id * SECTION.size)
+        heading, _, body = self.texts[offset:offset + length].decode("utf-8").partition("\n")
+        return article, heading, body
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[float, int]]:
+        """ Best matching sections as (score, section id) """
+        n = self.meta["sections"]
+        avg = self.meta["avg_section_tokens"] or 1
+        section_ids, partial = [], []
+        for term in set(tokenize(query)):
+            if term not in self.lexicon:
+                continue
+            position, count = self.lexicon[term]
+            idf = math.log(1 + (n - count + 0.5) / (count + 0.5))
+            postings = self.posting_array[position:position + count]
+            frequency = postings["frequency"].astype(np.float64)
+            tokens = self.section_tokens[postings["section"]]
+            norm = frequency + self.k1 * (1 - self.b + self.b * tokens / avg)
+            section_ids.append(postings["section"])
+            partial.append(idf * frequency * (self.k1 + 1) / norm)
+        if not section_ids:
+            return []
+
+        # Sum the scores of every section over the query terms
+        section_ids, partial = np.concatenate(section_ids), np.concatenate(partial)
+        order = np.argsort(section_ids, kind="stable")
+        section_ids, partial = section_ids[order], partial[order]
+        starts = np.flatnonzero(np.concatenate(([True], section_ids[1:] != section_ids[:-1])))
+        section_ids, scores = section_ids[starts], np.add.reduceat(partial, starts)
+
+        # Best first, the higher section id first on equal scores
+        if len(scores) > limit:
+            threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            keep = scores >= threshold
+            section_ids, scores = section_ids[keep], scores[keep]
+        best = np.lexsort((section_ids, scores))[::-1][:limit]
+        return [(float(scores[i]), int(section_ids[i])) for i in best]
+
+    def documents(self, query: str, max_docs: int = 2, sections_per_doc: int = 3,
+                  max_chars: int = 4000) -> list[Document]:
+        """ One Document per matching article, holding only its relevant sections """
+        by_article = {}
+        for score, section_id in self.search(query, limit=max_docs * sections_per_doc * 4):
+            article, heading, body = self.section(section_id)
+            if article not in by_article and len(by_article) == max_docs:
+                continue
+            matches = by_article.setdefault(article, [])
+            if len(matches) < sections_per_doc:
+                matches.append((score, heading, body))
+
+        documents = []
+        for article, matches in by_article.items():
+            title = self.titles[article]
+            content = "\n\n".join(f"== {heading} ==\n{body}" for _, heading, body in matches)[:max_chars]
+            documents.append(Document(page_content=content, metadata={
+                "title": title,
+                "sections": [heading for _, heading, _ in matches],
+                "score": round(matches[0][0], 3),
+                "source": "https://en.wikipedia.org/wiki/" + quote(title.replace(" ", "_")),
+            }))
+        return documents
+
+@lru_cache(maxsize=None)
+def open_snapshot(directory: str) -> WikipediaSnapshot:
+    return WikipediaSnapshot(directory)
+
+class WikipediaSnapshotLoader:
+    """ Drop-in for WikipediaLoader(query=..., load_max_docs=...).load() served from a snapshot """
+
+    def __init__(self, query: str, load_max_docs: int = 2, snapshot: str | None = None,
+                 doc_content_chars_max: int = 4000, **kwargs):
+        self.query = query
+        self.load_max_docs = load_max_docs
+        self.doc_content_chars_max = doc_content_chars_max
+        self.snapshot = snapshot or os.environ["WIKIPEDIA_SNAPSHOT"]
+
+    def load(self) -> list[Document]:
+        return open_snapshot(self.snapshot).documents(self.query, max_docs=self.load_max_docs,
+                                                      max_chars=self.doc_content_chars_max)
+
+def wikipedia_backend(live_loader):
+    """ The snapshot loader when WIKIPEDIA_SNAPSHOT is set, otherwise the live WikipediaLoader """
+    return WikipediaSnapshotLoader if os.environ.get("WIKIPEDIA_SNAPSHOT") else live_loader
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        limit = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+        print(build(sys.argv[2], sys.argv[3], max_articles=limit))
+    elif len(sys.argv) >= 4 and sys.argv[1] == "query":
+        for doc in WikipediaSnapshotLoader(" ".join(sys.argv[3:]), snapshot=sys.argv[2]).load():
+            print(doc.metadata)
+            print(doc.page_content[:500], "\n")
+    else:
+        print("usage: wiki_snapshot.py build <dump> <snapshot dir> [max articles]\n"
+              "       wiki_snapshot.py query <snapshot dir> <query>")
@@ -0,0 +1,19 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableBinding, RunnableParallel, RunnableSequence
+
+# Chat models that sit in front of another one (batching.py, cassette.py) let the wrapped
+# model build its bind_tools() and with_structured_output() runnables, so the requests
+# keep its tool_choice, response_format and parser, and then put themselves in its place.
+
+def through(runnable: Runnable, model: BaseChatModel, wrapper: BaseChatModel) -> Runnable:
+    """ A runnable built by model, with wrapper in place of model """
+    if runnable is model:
+        return wrapper
+    if isinstance(runnable, RunnableBinding):
+        return runnable.__class__(bound=through(runnable.bound, model, wrapper), kwargs=runnable.kwargs,
+                                  config=runnable.config)
+    if isinstance(runnable, RunnableSequence):
+        return RunnableSequence(*[through(step, model, wrapper) for step in runnable.steps])
+    if isinstance(runnable, RunnableParallel):
+        return RunnableParallel({key: through(step, model, wrapper) for key, step in runnable.steps__.items()})
+    return runnable